@@ -1,34 +1,173 @@
 from flask import Flask, render_template, request, send_file, jsonify
+import atexit
+import hmac
 import os
+import re
+import shutil
 import tempfile
+import threading
+import time
+import uuid
+import zipfile
 from functools import wraps
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 import requests
 import json
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, session, Response, Request
 
 # 导入文件处理工具
-from utils.file_processor import process_file, save_translated_file
+from utils.file_processor import process_file, process_file_targets, save_translated_file
+from utils.batch import BatchPipeline, collect_batch_files, zip_directory
+from utils.translation_memory import TranslationMemory
+from utils.job_manager import JobManager, JobCancelled, JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED, request_cancel
+from utils.job_checkpoint import JobCheckpoint, checkpoint_path, load_checkpoint_metadata
+from utils.api_client import ApiClient, iter_sse_data
+from utils.tokens import estimate_tokens
+from utils.chunker import chunk_text, join_chunks
+from utils.metrics import REGISTRY, record_event, timed
+from utils.run_markup import has_markup, strip_markup
+from utils.glossary import load_glossary, glossary_terms, format_glossary
+from utils.auth import AuditQueue, CredentialCache
+from utils.segment_filter import check_translation
 
 # 加载环境变量
 load_dotenv()
 
-# 创建Flask应用
-app = Flask(__name__)
-app.secret_key = os.urandom(24)  # 设置会话密钥，用于安全存储用户会话信息
-
 # 设置上传文件夹和允许的文件扩展名
 UPLOAD_FOLDER = tempfile.gettempdir()
 ALLOWED_EXTENSIONS = {'doc', 'docx', 'xls', 'xlsx', 'ppt', 'pptx'}
+MAX_UPLOAD_MB = float(os.getenv('MAX_UPLOAD_MB', '16'))
+# 批量翻译接口上传的zip压缩包大小上限
+BULK_MAX_UPLOAD_MB = float(os.getenv('BULK_MAX_UPLOAD_MB', '512'))
+
+# 上传文件直接写入磁盘上的临时文件，不在内存中缓冲
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.TemporaryFile(dir=UPLOAD_FOLDER)
+
+    # 批量翻译接口使用单独的上传大小限制
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'translate_batch_upload':
+            return int(BULK_MAX_UPLOAD_MB * 1024 * 1024)
+        return super().max_content_length
+
+# 创建Flask应用
+app = Flask(__name__)
+app.request_class = UploadRequest
+# 设置会话密钥，用于安全存储用户会话信息；多进程部署时所有工作进程必须使用同一个SECRET_KEY
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB上限
+app.config['MAX_CONTENT_LENGTH'] = int(MAX_UPLOAD_MB * 1024 * 1024)
 
 # 获取OpenAI API配置（默认值）
 DEFAULT_OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 DEFAULT_OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', 'http://modelurl/v1')
 DEFAULT_OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'modelname')
 
+# 并发翻译线程数（同时向模型API发送的请求数）
+TRANSLATE_MAX_WORKERS = int(os.getenv('TRANSLATE_MAX_WORKERS', '8'))
+
+# 模型API客户端配置：连接/读取超时、重试次数和客户端限流（每秒请求数，0表示不限流）
+# 限流器在每个进程内独立计数，gunicorn多进程部署时按工作进程数（由gunicorn.conf.py设置WEB_WORKER_COUNT）平均分配
+WEB_WORKER_COUNT = max(1, int(os.getenv('WEB_WORKER_COUNT', '1')))
+API_CONNECT_TIMEOUT = float(os.getenv('API_CONNECT_TIMEOUT', '5'))
+API_READ_TIMEOUT = float(os.getenv('API_READ_TIMEOUT', '120'))
+API_MAX_RETRIES = int(os.getenv('API_MAX_RETRIES', '4'))
+API_RATE_LIMIT = float(os.getenv('API_RATE_LIMIT', '0')) / WEB_WORKER_COUNT
+API_RATE_BURST = int(os.getenv('API_RATE_BURST', '0'))
+API_RATE_BURST = max(1, API_RATE_BURST // WEB_WORKER_COUNT) if API_RATE_BURST else None
+API_POOL_SIZE = int(os.getenv('API_POOL_SIZE', '32'))
+
+API_CLIENT = ApiClient(
+    connect_timeout=API_CONNECT_TIMEOUT,
+    read_timeout=API_READ_TIMEOUT,
+    max_retries=API_MAX_RETRIES,
+    rate_limit=API_RATE_LIMIT,
+    rate_burst=API_RATE_BURST,
+    pool_size=API_POOL_SIZE
+)
+
+# 流式响应：API_STREAM=1时使用stream模式，输出超过原文长度的STREAM_MAX_OUTPUT_RATIO倍时提前终止
+API_STREAM = os.getenv('API_STREAM', '0') == '1'
+STREAM_MAX_OUTPUT_RATIO = float(os.getenv('STREAM_MAX_OUTPUT_RATIO', '4'))
+
+# 按原文估算max_tokens：原文token数乘以MAX_TOKENS_RATIO，并限制在[MIN_MAX_TOKENS, MAX_TOKENS_LIMIT]之间
+MAX_TOKENS_RATIO = float(os.getenv('MAX_TOKENS_RATIO', '3'))
+MIN_MAX_TOKENS = int(os.getenv('MIN_MAX_TOKENS', '128'))
+MAX_TOKENS_LIMIT = int(os.getenv('MAX_TOKENS_LIMIT', '4096'))
+
+# 单次请求的原文token上限，超过时按句子边界切分后逐块翻译（0为不切分）
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', '1000'))
+
+# 账号验证服务客户端：超时较短，避免验证服务卡住请求线程
+AUTH_CONNECT_TIMEOUT = float(os.getenv('AUTH_CONNECT_TIMEOUT', '3'))
+AUTH_READ_TIMEOUT = float(os.getenv('AUTH_READ_TIMEOUT', '5'))
+AUTH_CLIENT = ApiClient(connect_timeout=AUTH_CONNECT_TIMEOUT, read_timeout=AUTH_READ_TIMEOUT, max_retries=1)
+
+# 验证通过的账号密码的缓存时间（秒，0为不缓存）
+AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', '300'))
+CREDENTIAL_CACHE = CredentialCache(AUTH_CACHE_TTL) if AUTH_CACHE_TTL > 0 else None
+
+# 审计事件（翻译行为记录）由后台线程批量发送：每批最多AUDIT_BATCH_SIZE个，最多等待AUDIT_FLUSH_INTERVAL秒；
+# AUDIT_BATCH_POST=1时一批事件作为JSON数组一次发送（需要验证服务支持），否则逐条发送
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', '50'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '0.5'))
+AUDIT_QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', '10000'))
+AUDIT_BATCH_POST = os.getenv('AUDIT_BATCH_POST', '0') == '1'
+
+# 批量翻译配置：把多个短片段合并为一次请求
+BATCH_ENABLED = os.getenv('BATCH_ENABLED', '1') == '1'
+BATCH_TOKEN_BUDGET = int(os.getenv('BATCH_TOKEN_BUDGET', '1500'))
+BATCH_MAX_SEGMENTS = int(os.getenv('BATCH_MAX_SEGMENTS', '40'))
+BATCH_SEGMENT_MAX_TOKENS = int(os.getenv('BATCH_SEGMENT_MAX_TOKENS', '64'))
+
+# 后台翻译任务配置（同时执行的文档数）
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# 任务工作目录：每个任务一个子目录，保存原始文件、检查点、任务状态和译文，所有工作进程共享
+JOBS_FOLDER = os.getenv('JOBS_DIR', os.path.join(UPLOAD_FOLDER, 'translate4original_jobs'))
+# 已完成但未下载的译文保留时间，失败或中断任务（可继续翻译）的保留时间
+OUTPUT_RETENTION_SECONDS = int(os.getenv('OUTPUT_RETENTION_SECONDS', '3600'))
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', str(24 * 3600)))
+JOB_SWEEP_INTERVAL = int(os.getenv('JOB_SWEEP_INTERVAL', '300'))
+JOB_MANAGER = JobManager(
+    max_workers=JOB_WORKERS,
+    retention_seconds=JOB_RETENTION_SECONDS,
+    jobs_dir=JOBS_FOLDER,
+    output_retention_seconds=OUTPUT_RETENTION_SECONDS
+)
+JOB_MANAGER.start_sweeper(JOB_SWEEP_INTERVAL)
+
+# 批量翻译配置：压缩包中的文件数和解压后大小上限，解析、保存的并发文档数，所有文档共用的翻译线程数
+BULK_MAX_FILES = int(os.getenv('BULK_MAX_FILES', '500'))
+BULK_MAX_EXTRACT_MB = float(os.getenv('BULK_MAX_EXTRACT_MB', '2048'))
+BULK_PARSE_WORKERS = int(os.getenv('BULK_PARSE_WORKERS', '2'))
+BULK_SAVE_WORKERS = int(os.getenv('BULK_SAVE_WORKERS', '2'))
+BULK_TRANSLATE_WORKERS = int(os.getenv('BULK_TRANSLATE_WORKERS', str(TRANSLATE_MAX_WORKERS)))
+
+# /metrics访问令牌；为空时/metrics不可访问，除非METRICS_PUBLIC为1（不校验令牌，只应在内网或由反向代理限制访问时使用）
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.getenv('METRICS_PUBLIC', '0') == '1'
+
+# 是否在本地跳过数字、日期、编号、网址和已是目标语言的片段
+SKIP_FILTER_ENABLED = os.getenv('SKIP_FILTER_ENABLED', '1') == '1'
+
+# 超过该大小（MB）的XLSX文件使用流式模式处理
+XLSX_STREAM_THRESHOLD_MB = float(os.getenv('XLSX_STREAM_THRESHOLD_MB', '5'))
+
+# 翻译记忆配置（TM_DB_PATH为空字符串时仅使用内存缓存）
+TM_ENABLED = os.getenv('TM_ENABLED', '1') == '1'
+TM_DB_PATH = os.getenv('TM_DB_PATH', os.path.join(tempfile.gettempdir(), 'translate4original_tm.sqlite3'))
+TM_MAX_MEMORY_ENTRIES = int(os.getenv('TM_MAX_MEMORY_ENTRIES', '10000'))
+TM_MAX_DISK_ENTRIES = int(os.getenv('TM_MAX_DISK_ENTRIES', '200000'))
+
+TRANSLATION_MEMORY = TranslationMemory(
+    TM_DB_PATH or None,
+    max_memory_entries=TM_MAX_MEMORY_ENTRIES,
+    max_disk_entries=TM_MAX_DISK_ENTRIES
+) if TM_ENABLED else None
+
 # 支持的语言列表
 SUPPORTED_LANGUAGES = [
     {'code': 'zh', 'name': '中文'},
@@ -43,15 +182,102 @@ DEFAULT_PROMPT_STEP1 = "你是一位专业的语言学家，专业于从事{{sou
 # 默认提示词 - 第二步翻译纠错
 DEFAULT_PROMPT_STEP2 = "你是一位专业的语言学家，专门从事到{{source_lang}}到{{target_lang}}的翻译工作。你将获得一段{{source_lang}}及其翻译（第一步提示词后生成的译文，你的目标是改进这个翻译。你的任务是仔细阅读{{source_lang}}，并参照第一步提示词后生成的译文，进行修改和完善翻译。请在编辑翻译时考虑以下几点：\n(i) 准确性（通过纠正添加错误、误译、遗漏或未翻译的文本）\n(ii) 流畅性（通过应用{{target_lang}}的语法、拼写和标点规则，确保没有不必要的重复）\n(iii) 风格（通过确保翻译反映源文本的风格）(iv) 术语（不适合上下文的术语、使用不一致）\n(v) 其他错误\n请只提供翻译内容，不要提供任何解释和其他文本。"
 
+# 第二步纠错策略
+REFINE_ALWAYS = 'always'
+REFINE_NEVER = 'never'
+REFINE_LENGTH = 'length'
+REFINE_CHECK = 'check'
+REFINE_POLICIES = (REFINE_ALWAYS, REFINE_NEVER, REFINE_LENGTH, REFINE_CHECK)
+DEFAULT_REFINE_POLICY = os.getenv('REFINE_POLICY', REFINE_ALWAYS)
+DEFAULT_REFINE_MIN_CHARS = int(os.getenv('REFINE_MIN_CHARS', '40'))
+
+# 翻译模式：two_step为两步翻译（初译+纠错），context为上下文翻译（每个片段一次调用，附带相邻片段和术语表）
+MODE_TWO_STEP = 'two_step'
+MODE_CONTEXT = 'context'
+TRANSLATION_MODES = (MODE_TWO_STEP, MODE_CONTEXT)
+DEFAULT_TRANSLATION_MODE = os.getenv('TRANSLATION_MODE', MODE_TWO_STEP)
+# 上下文翻译附带的上文、下文片段数
+CONTEXT_BEFORE = int(os.getenv('CONTEXT_BEFORE', '2'))
+CONTEXT_AFTER = int(os.getenv('CONTEXT_AFTER', '1'))
+# 上传术语表的最大条数
+GLOSSARY_MAX_TERMS = int(os.getenv('GLOSSARY_MAX_TERMS', '2000'))
+
 # 账号验证API地址(账号验证界面）
-AUTH_API_URL = 'http://API_AUTH'
+AUTH_API_URL = os.getenv('AUTH_API_URL', 'http://API_AUTH')
+
+# 发送一批审计事件到验证服务
+def send_audit_events(events):
+    if AUDIT_BATCH_POST:
+        AUTH_CLIENT.post(AUTH_API_URL, json=events).raise_for_status()
+        return
+    for event in events:
+        AUTH_CLIENT.post(AUTH_API_URL, json=event).raise_for_status()
+
+AUDIT_QUEUE = AuditQueue(send_audit_events, AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL, AUDIT_QUEUE_SIZE)
+# 进程正常退出时尽量发送队列中剩余的审计事件
+atexit.register(AUDIT_QUEUE.flush, 5)
 
 # 检查文件扩展名是否允许
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# 调用OpenAI API进行翻译
-def translate_with_openai(text, source_lang, target_lang, custom_prompt=None, api_key=None, api_base=None, model=None):
+# 上传文件的原始文件名：只保留最后一级路径并去掉控制字符，保留中文等非ASCII字符，文件名无效时返回None
+# 原始文件名只用于译文文件名和下载文件名，上传的文件以生成的文件名保存在任务的工作目录中
+def original_filename(filename):
+    name = filename.replace('\\', '/').rsplit('/', 1)[-1]
+    name = ''.join(char for char in name if char.isprintable()).strip()
+    return name if name.strip('.') else None
+
+# 原文包含行内格式标记时追加到系统提示词的说明
+MARKUP_INSTRUCTION = "\n\n原文中的<g1>、</g1>等标记表示不同格式的文本区间。请在译文中原样保留这些标记，并让每对标记包住对应内容的译文，不要增加、删除或改写标记。"
+
+# 根据原文长度估算输出所需的max_tokens，避免统一申请4096个token
+def max_tokens_for(source_text):
+    estimated = estimate_tokens(source_text) * MAX_TOKENS_RATIO + 64
+    return int(min(MAX_TOKENS_LIMIT, max(MIN_MAX_TOKENS, estimated)))
+
+# 模型输出不完整（达到max_tokens或流式响应被提前终止），不完整的译文不能使用，也不能写入翻译记忆和检查点
+class TruncatedOutput(Exception):
+    pass
+
+# 读取流式响应，返回(输出文本, finish_reason)；任务取消时中止请求
+# 输出超过max_output_chars时提前终止并抛出TruncatedOutput
+# usage为字典时写入服务端返回的token用量（服务端在流中提供usage时）
+def read_stream_content(response, max_output_chars=None, job=None, usage=None):
+    parts = []
+    length = 0
+    finish_reason = None
+    try:
+        for data in iter_sse_data(response):
+            if job is not None:
+                job.check_cancelled()
+            chunk = json.loads(data)
+            if usage is not None and chunk.get('usage'):
+                usage.update(chunk['usage'])
+            choices = chunk.get('choices') or []
+            if choices and choices[0].get('finish_reason'):
+                finish_reason = choices[0]['finish_reason']
+            delta = choices[0].get('delta', {}).get('content') if choices else None
+            if not delta:
+                continue
+            parts.append(delta)
+            length += len(delta)
+            if max_output_chars and length > max_output_chars:
+                # 输出远超原文长度，模型可能在重复或跑题，提前终止以节省token
+                if job is not None:
+                    job.incr('early_stops')
+                raise TruncatedOutput('模型输出远超原文长度，已提前终止')
+    finally:
+        response.close()
+    return ''.join(parts), finish_reason
+
+# 调用聊天补全接口，返回模型输出的文本
+# 流式模式下输出超过原文长度的STREAM_MAX_OUTPUT_RATIO倍时提前终止；job被取消时中止请求
+# 输出因max_tokens被截断（finish_reason为length）时用MAX_TOKENS_LIMIT重试一次，仍被截断或提前终止时抛出TruncatedOutput
+# step为请求所属的翻译步骤（step1、step2、batch_step1、batch_step2、context、batch_context），用于统计耗时、重试和token用量
+# markup_instruction为False时不按原文追加格式标记说明（系统提示词已固定包含该说明）
+def call_chat_completion(system_prompt, user_content, api_key=None, api_base=None, model=None, max_tokens=None, job=None, step='step1',
+                         markup_instruction=True):
     # 使用传入的API配置，如果没有则使用默认值
     api_key = api_key or DEFAULT_OPENAI_API_KEY
     api_base = api_base or DEFAULT_OPENAI_API_BASE
@@ -59,9 +285,10 @@ def translate_with_openai(text, source_lang, target_lang, custom_prompt=None, ap
     
     if not api_key:
         raise ValueError("OpenAI API密钥未配置，请在API设置中输入您的密钥")
-    
-    prompt = custom_prompt or DEFAULT_PROMPT_STEP1
-    prompt = prompt.replace("{{source_lang}}", source_lang).replace("{{target_lang}}", target_lang)
+    if job is not None:
+        job.check_cancelled()
+    if markup_instruction and has_markup(user_content):
+        system_prompt += MARKUP_INSTRUCTION
     
     headers = {
         "Content-Type": "application/json",
@@ -71,18 +298,45 @@ def translate_with_openai(text, source_lang, target_lang, custom_prompt=None, ap
     data = {
         "model": model,
         "messages": [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": text}
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
         ],
-        "max_tokens": 4096
+        "max_tokens": max_tokens or max_tokens_for(user_content)
     }
+    if API_STREAM:
+        data["stream"] = True
     
     try:
-        response = requests.post(f"{api_base}/chat/completions", headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
+        while True:
+            usage = {}
+            with timed('translate_api_request_seconds', job, f'api_{step}', step=step):
+                response = API_CLIENT.post(f"{api_base}/chat/completions", headers=headers, data=json.dumps(data), stream=API_STREAM)
+                record_event(job, 'api_calls')
+                record_event(job, 'api_retries', getattr(response, 'retries', 0))
+                response.raise_for_status()
+                if API_STREAM:
+                    content, finish_reason = read_stream_content(
+                        response, int(len(user_content) * STREAM_MAX_OUTPUT_RATIO) + 200, job, usage
+                    )
+                else:
+                    result = response.json()
+                    usage = result.get('usage') or {}
+                    content = result['choices'][0]['message']['content']
+                    finish_reason = result['choices'][0].get('finish_reason')
+            record_event(job, 'prompt_tokens', usage.get('prompt_tokens') or 0)
+            record_event(job, 'completion_tokens', usage.get('completion_tokens') or 0)
+            if finish_reason != 'length':
+                return content
+            
+            record_event(job, 'truncated_outputs')
+            if data['max_tokens'] >= MAX_TOKENS_LIMIT:
+                raise TruncatedOutput('模型输出达到max_tokens上限，译文不完整')
+            # 按原文估算的max_tokens不够（例如分词器对目标语言每个字符使用一个token），用上限重试一次
+            data['max_tokens'] = MAX_TOKENS_LIMIT
+    except (JobCancelled, TruncatedOutput):
+        raise
     except requests.exceptions.HTTPError as http_err:
+        record_event(job, 'api_errors')
         if http_err.response.status_code == 401:
             raise Exception("API密钥无效，请检查您的密钥是否正确")
         elif http_err.response.status_code == 429:
@@ -92,8 +346,58 @@ def translate_with_openai(text, source_lang, target_lang, custom_prompt=None, ap
     except Exception as e:
         raise Exception(f"翻译过程中出错: {str(e)}")
 
-# 两步翻译流程
-def two_step_translation(text, source_lang, target_lang, prompt_step1=None, prompt_step2=None, api_key=None, api_base=None, model=None):
+# 第二步纠错失败时返回的第一步译文：可以作为本次任务的结果，但不写入翻译记忆，之后重新翻译时再尝试纠错
+class RefineFallback(str):
+    pass
+
+# 替换提示词中的语言变量
+def render_prompt(prompt, source_lang, target_lang):
+    return prompt.replace("{{source_lang}}", source_lang).replace("{{target_lang}}", target_lang)
+
+# 调用OpenAI API进行翻译
+def translate_with_openai(text, source_lang, target_lang, custom_prompt=None, api_key=None, api_base=None, model=None, job=None):
+    prompt = render_prompt(custom_prompt or DEFAULT_PROMPT_STEP1, source_lang, target_lang)
+    return call_chat_completion(prompt, text, api_key, api_base, model, job=job)
+
+# 根据纠错策略判断是否需要执行第二步纠错
+def should_refine(text, translated_text, source_lang, target_lang, refine_policy=None, refine_min_chars=None):
+    refine_policy = refine_policy or DEFAULT_REFINE_POLICY
+    if refine_policy == REFINE_NEVER:
+        return False
+    if refine_policy == REFINE_LENGTH:
+        min_chars = DEFAULT_REFINE_MIN_CHARS if refine_min_chars is None else refine_min_chars
+        return len(text.strip()) >= min_chars
+    if refine_policy == REFINE_CHECK:
+        return bool(check_translation(text, translated_text, source_lang, target_lang))
+    return True
+
+# 两步翻译流程，超过CHUNK_MAX_TOKENS的片段按句子边界切分后逐块翻译再拼接
+# refine_policy控制第二步纠错：always（总是）、never（从不）、length（原文不少于refine_min_chars个字符）、check（本地检查发现问题时）
+# job为当前翻译任务，用于记录第二步纠错的调用和跳过次数，以及响应取消请求
+def two_step_translation(text, source_lang, target_lang, prompt_step1=None, prompt_step2=None, api_key=None, api_base=None, model=None,
+                         refine_policy=None, refine_min_chars=None, job=None):
+    with timed('translate_segment_seconds'):
+        chunks = chunk_text(text, CHUNK_MAX_TOKENS)
+        if len(chunks) == 1:
+            return translate_chunk(text, source_lang, target_lang, prompt_step1, prompt_step2, api_key, api_base, model,
+                                   refine_policy, refine_min_chars, job)
+        
+        if job:
+            job.incr('chunked_segments')
+            job.incr('chunks', len(chunks))
+        translated_chunks = [
+            translate_chunk(chunk, source_lang, target_lang, prompt_step1, prompt_step2, api_key, api_base, model,
+                            refine_policy, refine_min_chars, job)
+            for chunk, _ in chunks
+        ]
+        translated_text = join_chunks(translated_chunks, [separator for _, separator in chunks], target_lang)
+        if any(isinstance(chunk, RefineFallback) for chunk in translated_chunks):
+            return RefineFallback(translated_text)
+        return translated_text
+
+# 对不超过CHUNK_MAX_TOKENS的文本执行两步翻译
+def translate_chunk(text, source_lang, target_lang, prompt_step1=None, prompt_step2=None, api_key=None, api_base=None, model=None,
+                    refine_policy=None, refine_min_chars=None, job=None):
     # 第一步：初步翻译
     step1_prompt = prompt_step1 or DEFAULT_PROMPT_STEP1
     translated_text = translate_with_openai(
@@ -103,42 +407,232 @@ def two_step_translation(text, source_lang, target_lang, prompt_step1=None, prom
         step1_prompt,
         api_key,
         api_base,
-        model
+        model,
+        job
     )
     
+    if not should_refine(text, translated_text, source_lang, target_lang, refine_policy, refine_min_chars):
+        if job:
+            job.incr('step2_skipped')
+        return translated_text
+    
     # 第二步：翻译纠错和完善
-    step2_prompt = prompt_step2 or DEFAULT_PROMPT_STEP2
-    step2_prompt = step2_prompt.replace("{{source_lang}}", source_lang).replace("{{target_lang}}", target_lang)
+    step2_prompt = render_prompt(prompt_step2 or DEFAULT_PROMPT_STEP2, source_lang, target_lang)
     
     # 构建第二步的提示词，包含原文和初步翻译结果
     correction_prompt = f"原文: {text}\n\n初步翻译: {translated_text}"
     
-    # 调用API进行纠错
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key or DEFAULT_OPENAI_API_KEY}"
-    }
+    if job:
+        job.incr('step2_calls')
+    try:
+        # 调用API进行纠错，输出长度按原文估算（纠错输入包含原文和初步翻译）
+        return call_chat_completion(step2_prompt, correction_prompt, api_key, api_base, model, max_tokens_for(text), job, 'step2')
+    except JobCancelled:
+        raise
+    except Exception:
+        # 如果第二步出错，返回第一步的翻译结果
+        return RefineFallback(translated_text)
+
+# 批量翻译的附加说明，追加在系统提示词之后
+BATCH_STEP1_INSTRUCTION = "\n\n输入是一个JSON对象，键为片段编号，值为需要翻译的文本。请逐条翻译每个值，只返回一个键完全相同的JSON对象，值为对应的译文。不要合并、拆分或遗漏任何片段，不要输出JSON以外的内容。"
+BATCH_STEP2_INSTRUCTION = "\n\n输入是一个JSON对象，键为片段编号，值包含原文(source)和初步翻译(draft)。请逐条改进每个片段的翻译，只返回一个键完全相同的JSON对象，值为改进后的译文。不要合并、拆分或遗漏任何片段，不要输出JSON以外的内容。"
+
+# 解析批量翻译的JSON回复，编号与请求不一致时返回None
+def parse_batch_response(content, count):
+    start = content.find('{')
+    end = content.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        result = json.loads(content[start:end + 1])
+    except ValueError:
+        return None
     
-    data = {
-        "model": model or DEFAULT_OPENAI_MODEL,
-        "messages": [
-            {"role": "system", "content": step2_prompt},
-            {"role": "user", "content": correction_prompt}
-        ],
-        "max_tokens": 4096
+    expected_keys = [str(i + 1) for i in range(count)]
+    if not isinstance(result, dict) or sorted(result.keys()) != sorted(expected_keys):
+        return None
+    if not all(isinstance(result[key], str) for key in expected_keys):
+        return None
+    return [result[key] for key in expected_keys]
+
+# 批量两步翻译：多个短片段合并为一次请求，编号不匹配或输出被截断时退回逐条翻译
+def two_step_translation_batch(texts, source_lang, target_lang, prompt_step1=None, prompt_step2=None, api_key=None, api_base=None, model=None,
+                               refine_policy=None, refine_min_chars=None, job=None):
+    # 第一步：批量初步翻译
+    step1_prompt = render_prompt(prompt_step1 or DEFAULT_PROMPT_STEP1, source_lang, target_lang) + BATCH_STEP1_INSTRUCTION
+    payload = {str(i + 1): text for i, text in enumerate(texts)}
+    try:
+        content = call_chat_completion(step1_prompt, json.dumps(payload, ensure_ascii=False), api_key, api_base, model, job=job, step='batch_step1')
+    except TruncatedOutput:
+        content = ''
+    translated_texts = parse_batch_response(content, len(texts))
+    if translated_texts is None:
+        return [
+            two_step_translation(text, source_lang, target_lang, prompt_step1, prompt_step2, api_key, api_base, model,
+                                 refine_policy, refine_min_chars, job)
+            for text in texts
+        ]
+    
+    # 按纠错策略筛选需要第二步纠错的片段
+    refine_indexes = [
+        index for index, (text, draft) in enumerate(zip(texts, translated_texts))
+        if should_refine(text, draft, source_lang, target_lang, refine_policy, refine_min_chars)
+    ]
+    if job and len(refine_indexes) < len(texts):
+        job.incr('step2_skipped', len(texts) - len(refine_indexes))
+    if not refine_indexes:
+        return translated_texts
+    
+    # 第二步：批量纠错，失败时返回第一步的翻译结果
+    step2_prompt = render_prompt(prompt_step2 or DEFAULT_PROMPT_STEP2, source_lang, target_lang) + BATCH_STEP2_INSTRUCTION
+    payload = {
+        str(i + 1): {'source': texts[index], 'draft': translated_texts[index]}
+        for i, index in enumerate(refine_indexes)
     }
+    if job:
+        job.incr('step2_calls')
+    try:
+        content = call_chat_completion(step2_prompt, json.dumps(payload, ensure_ascii=False), api_key, api_base, model, job=job, step='batch_step2')
+    except JobCancelled:
+        raise
+    except Exception:
+        content = ''
+    refined_texts = parse_batch_response(content, len(refine_indexes))
+    for i, index in enumerate(refine_indexes):
+        # 纠错失败或回复无法解析时返回第一步的翻译结果
+        translated_texts[index] = refined_texts[i] if refined_texts else RefineFallback(translated_texts[index])
+    return translated_texts
+
+# 生成翻译记忆的缓存键，纠错策略不同时译文也可能不同
+def memory_key(text, source_lang, target_lang, prompt_step1=None, prompt_step2=None, model=None, refine_policy=None, refine_min_chars=None):
+    refine_policy = refine_policy or DEFAULT_REFINE_POLICY
+    variant = ''
+    if refine_policy != REFINE_ALWAYS:
+        variant = f"refine={refine_policy}"
+        if refine_policy == REFINE_LENGTH:
+            variant += f":{DEFAULT_REFINE_MIN_CHARS if refine_min_chars is None else refine_min_chars}"
+    return TranslationMemory.make_key(
+        text,
+        source_lang,
+        target_lang,
+        prompt_step1 or DEFAULT_PROMPT_STEP1,
+        prompt_step2 or DEFAULT_PROMPT_STEP2,
+        model or DEFAULT_OPENAI_MODEL,
+        variant
+    )
+
+# 查询翻译记忆，未命中的原文调用translate_missing(未命中的原文列表)翻译，译文写入翻译记忆
+# key_func(原文)生成缓存键；未启用翻译记忆时直接翻译全部原文；第二步纠错失败的第一步译文不写入翻译记忆
+def translate_missing_with_memory(texts, key_func, translate_missing, job=None):
+    if TRANSLATION_MEMORY is None:
+        return translate_missing(texts)
+    
+    keys = [key_func(text) for text in texts]
+    results = [TRANSLATION_MEMORY.get(key) for key in keys]
+    missing = [index for index, result in enumerate(results) if result is None]
+    record_event(job, 'tm_hits', len(texts) - len(missing))
+    record_event(job, 'tm_misses', len(missing))
     
+    if missing:
+        translated_texts = translate_missing([texts[index] for index in missing])
+        for index, translated_text in zip(missing, translated_texts):
+            results[index] = translated_text
+            if not isinstance(translated_text, RefineFallback):
+                TRANSLATION_MEMORY.put(keys[index], translated_text)
+    return results
+
+# 带翻译记忆的两步翻译：命中时直接返回本地译文，不调用API
+def translate_with_memory(text, source_lang, target_lang, prompt_step1=None, prompt_step2=None, api_key=None, api_base=None, model=None,
+                          refine_policy=None, refine_min_chars=None, job=None):
+    return translate_missing_with_memory(
+        [text],
+        lambda text: memory_key(text, source_lang, target_lang, prompt_step1, prompt_step2, model, refine_policy, refine_min_chars),
+        lambda missing: [
+            two_step_translation(missing[0], source_lang, target_lang, prompt_step1, prompt_step2, api_key, api_base, model,
+                                 refine_policy, refine_min_chars, job)
+        ],
+        job
+    )[0]
+
+# 带翻译记忆的批量两步翻译：只把未命中的片段发送给模型
+def translate_batch_with_memory(texts, source_lang, target_lang, prompt_step1=None, prompt_step2=None, api_key=None, api_base=None, model=None,
+                                refine_policy=None, refine_min_chars=None, job=None):
+    return translate_missing_with_memory(
+        texts,
+        lambda text: memory_key(text, source_lang, target_lang, prompt_step1, prompt_step2, model, refine_policy, refine_min_chars),
+        lambda missing: two_step_translation_batch(
+            missing, source_lang, target_lang, prompt_step1, prompt_step2, api_key, api_base, model,
+            refine_policy, refine_min_chars, job
+        ),
+        job
+    )
+
+# 上下文翻译的附加说明和术语表说明，追加在系统提示词之后
+CONTEXT_INSTRUCTION = "\n\n用户消息中【上文】和【下文】是文档中与待翻译文本相邻的原文，仅用于理解语境、保持术语和风格一致，不要翻译它们。请只翻译【待翻译】部分，只输出其译文。"
+GLOSSARY_INSTRUCTION = "\n\n翻译时必须使用以下术语表中的译法，每行为“原文术语 => 译文术语”：\n"
+# 上下文批量翻译的格式说明放在用户消息中，使系统提示词与逐条翻译时完全相同
+CONTEXT_BATCH_INSTRUCTION = "【待翻译】部分是一个JSON对象，键为片段编号，值为文档中按顺序排列、需要翻译的文本，相邻片段互为上下文。请逐条翻译每个值，只返回一个键完全相同的JSON对象，值为对应的译文。不要合并、拆分或遗漏任何片段，不要输出JSON以外的内容。\n\n"
+
+# 上下文翻译的系统提示词：包含第一步提示词、上下文说明、格式标记说明和目标语言适用的术语表
+# 同一任务、同一目标语言的所有请求使用逐字节相同的系统提示词，服务端可以复用提示词前缀缓存
+def context_system_prompt(source_lang, target_lang, prompt_step1=None, glossary=None):
+    system_prompt = render_prompt(prompt_step1 or DEFAULT_PROMPT_STEP1, source_lang, target_lang) + CONTEXT_INSTRUCTION + MARKUP_INSTRUCTION
+    terms = glossary_terms(glossary, target_lang)
+    if terms:
+        system_prompt += GLOSSARY_INSTRUCTION + format_glossary(terms)
+    return system_prompt
+
+# 上下文翻译的用户消息：相邻片段去除格式标记后作为上文、下文，待翻译文本放在最后
+def context_user_content(text, context=None):
+    before, after = context or ((), ())
+    parts = []
+    if before:
+        parts.append('【上文】\n' + '\n'.join(strip_markup(item) for item in before))
+    if after:
+        parts.append('【下文】\n' + '\n'.join(strip_markup(item) for item in after))
+    parts.append('【待翻译】\n' + text)
+    return '\n\n'.join(parts)
+
+# 上下文翻译：每个片段（超长片段的每一块）一次调用，不执行第二步纠错，术语一致性由系统提示词中的术语表保证
+def context_translation(text, source_lang, target_lang, system_prompt, api_key=None, api_base=None, model=None, job=None, context=None):
+    with timed('translate_segment_seconds'):
+        chunks = chunk_text(text, CHUNK_MAX_TOKENS)
+        if len(chunks) > 1 and job:
+            job.incr('chunked_segments')
+            job.incr('chunks', len(chunks))
+        translated_chunks = [
+            call_chat_completion(system_prompt, context_user_content(chunk, context), api_key, api_base, model, max_tokens_for(chunk), job,
+                                 'context', markup_instruction=False)
+            for chunk, _ in chunks
+        ]
+        if len(chunks) == 1:
+            return translated_chunks[0]
+        return join_chunks(translated_chunks, [separator for _, separator in chunks], target_lang)
+
+# 上下文批量翻译：多个相邻的短片段合并为一次请求，context为整批的(上文列表, 下文列表)
+# 编号不匹配或输出被截断时退回逐条翻译
+def context_translation_batch(texts, source_lang, target_lang, system_prompt, api_key=None, api_base=None, model=None, job=None,
+                              context=None):
+    payload = {str(i + 1): text for i, text in enumerate(texts)}
+    user_content = CONTEXT_BATCH_INSTRUCTION + context_user_content(json.dumps(payload, ensure_ascii=False), context)
     try:
-        response = requests.post(f"{(api_base or DEFAULT_OPENAI_API_BASE)}/chat/completions", headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-    except Exception as e:
-        # 如果第二步出错，返回第一步的翻译结果
-        return translated_text
+        content = call_chat_completion(system_prompt, user_content, api_key, api_base, model, job=job, step='batch_context',
+                                       markup_instruction=False)
+    except TruncatedOutput:
+        content = ''
+    translated_texts = parse_batch_response(content, len(texts))
+    if translated_texts is None:
+        return [context_translation(text, source_lang, target_lang, system_prompt, api_key, api_base, model, job, context) for text in texts]
+    return translated_texts
+
+# 上下文翻译的翻译记忆缓存键：系统提示词已包含提示词和术语表；相邻片段不计入缓存键
+def context_memory_key(text, source_lang, target_lang, system_prompt, model=None):
+    return TranslationMemory.make_key(text, source_lang, target_lang, system_prompt, '', model or DEFAULT_OPENAI_MODEL, MODE_CONTEXT)
 
-# 验证账号密码的函数
+# 验证账号密码的函数，验证通过的结果在AUTH_CACHE_TTL秒内缓存
 def verify_user_credentials(userid, password):
+    if CREDENTIAL_CACHE is not None and CREDENTIAL_CACHE.get(userid, password):
+        return True, "验证通过"
     try:
         # 准备请求数据
         data = {
@@ -147,7 +641,8 @@ def verify_user_credentials(userid, password):
         }
         
         # 发送POST请求到验证API
-        response = requests.post(AUTH_API_URL, json=data)
+        with timed('translate_auth_request_seconds'):
+            response = AUTH_CLIENT.post(AUTH_API_URL, json=data)
         response.raise_for_status()
         
         # 解析响应
@@ -155,6 +650,8 @@ def verify_user_credentials(userid, password):
         
         # 根据返回结果判断验证是否通过
         if result == 1:
+            if CREDENTIAL_CACHE is not None:
+                CREDENTIAL_CACHE.put(userid, password)
             return True, "验证通过"
         elif result == 0:
             return False, "账号或密码不正确"
@@ -238,7 +735,329 @@ def settings():
     return render_template('settings.html', 
                           languages=SUPPORTED_LANGUAGES,
                           default_prompt_step1=DEFAULT_PROMPT_STEP1,
-                          default_prompt_step2=DEFAULT_PROMPT_STEP2)
+                          default_prompt_step2=DEFAULT_PROMPT_STEP2,
+                          default_refine_policy=DEFAULT_REFINE_POLICY,
+                          default_refine_min_chars=DEFAULT_REFINE_MIN_CHARS,
+                          default_translation_mode=DEFAULT_TRANSLATION_MODE)
+
+# 创建传递API配置参数和两步翻译流程的翻译函数，返回(单条翻译函数, 批量翻译函数)
+# translation_mode为context时返回上下文翻译函数，glossary为load_glossary读取的术语表
+def make_translate_funcs(job, prompt_step1, prompt_step2, api_key, api_base, model, refine_policy=None, refine_min_chars=None,
+                         translation_mode=None, glossary=None):
+    if (translation_mode or DEFAULT_TRANSLATION_MODE) == MODE_CONTEXT:
+        return make_context_translate_funcs(job, prompt_step1, api_key, api_base, model, glossary)
+    
+    def translate_wrapper(text, source, target, prompt=None):
+        # prompt参数在这里不会使用，因为我们需要两个不同的提示词
+        return translate_with_memory(
+            text, 
+            source, 
+            target, 
+            prompt_step1, 
+            prompt_step2, 
+            api_key, 
+            api_base, 
+            model,
+            refine_policy,
+            refine_min_chars,
+            job
+        )
+    
+    # 批量翻译的包装函数
+    def batch_translate_wrapper(texts, source, target, prompt=None):
+        return translate_batch_with_memory(
+            texts,
+            source,
+            target,
+            prompt_step1,
+            prompt_step2,
+            api_key,
+            api_base,
+            model,
+            refine_policy,
+            refine_min_chars,
+            job
+        )
+    
+    return translate_wrapper, batch_translate_wrapper
+
+# 创建上下文翻译函数，返回(单条翻译函数, 批量翻译函数)；单条翻译函数的context参数为(上文列表, 下文列表)
+# 每种源语言、目标语言组合的系统提示词只生成一次，任务内的所有请求共用同一个前缀
+def make_context_translate_funcs(job, prompt_step1, api_key, api_base, model, glossary=None):
+    system_prompts = {}
+    
+    def system_prompt_for(source, target):
+        if (source, target) not in system_prompts:
+            system_prompts[(source, target)] = context_system_prompt(source, target, prompt_step1, glossary)
+        return system_prompts[(source, target)]
+    
+    def translate_wrapper(text, source, target, prompt=None, context=None):
+        system_prompt = system_prompt_for(source, target)
+        return translate_missing_with_memory(
+            [text],
+            lambda text: context_memory_key(text, source, target, system_prompt, model),
+            lambda missing: [context_translation(missing[0], source, target, system_prompt, api_key, api_base, model, job, context)],
+            job
+        )[0]
+    
+    def batch_translate_wrapper(texts, source, target, prompt=None, context=None):
+        system_prompt = system_prompt_for(source, target)
+        return translate_missing_with_memory(
+            texts,
+            lambda text: context_memory_key(text, source, target, system_prompt, model),
+            lambda missing: context_translation_batch(missing, source, target, system_prompt, api_key, api_base, model, job, context),
+            job
+        )
+    
+    return translate_wrapper, batch_translate_wrapper
+
+# 上下文翻译模式下传给文档处理流程的相邻片段数
+def context_window_for(translation_mode):
+    if (translation_mode or DEFAULT_TRANSLATION_MODE) == MODE_CONTEXT:
+        return (CONTEXT_BEFORE, CONTEXT_AFTER)
+    return None
+
+# 在后台线程中执行翻译任务，返回结果写入任务状态
+# 翻译过程中每个片段的译文写入检查点，任务失败时保留检查点和原始文件以便继续翻译
+# 译文保存在任务的工作目录中，不同任务的同名文件互不覆盖
+# target_langs为多个[语言代码, 语言名称]时，文档只解析一次并同时翻译为各目标语言，每种语言一个文件，打包为zip
+# translation_mode为翻译模式，glossary为上下文翻译使用的术语表
+def run_translation_job(job, input_path, filename, source_lang, target_lang, prompt_step1, prompt_step2, api_key, api_base, model,
+                        refine_policy=None, refine_min_chars=None, target_langs=None, translation_mode=None, glossary=None):
+    checkpoint = JobCheckpoint(checkpoint_path(job.work_dir))
+    # API密钥不写入磁盘，继续翻译时由请求重新提供
+    checkpoint.save_metadata({
+        'owner': job.owner,
+        'input_path': input_path,
+        'filename': filename,
+        'source_lang': source_lang,
+        'target_lang': target_lang,
+        'target_langs': target_langs,
+        'prompt_step1': prompt_step1,
+        'prompt_step2': prompt_step2,
+        'api_base': api_base,
+        'model': model,
+        'refine_policy': refine_policy,
+        'refine_min_chars': refine_min_chars,
+        'translation_mode': translation_mode,
+        'glossary': glossary
+    })
+    try:
+        translate_wrapper, batch_translate_wrapper = make_translate_funcs(
+            job, prompt_step1, prompt_step2, api_key, api_base, model, refine_policy, refine_min_chars, translation_mode, glossary
+        )
+        
+        # 统计各阶段耗时：process_file中除翻译和写回外的时间为文档解析
+        def phase_timer(phase):
+            return timed('translate_job_phase_seconds', job, phase, phase=phase)
+        
+        process_options = dict(
+            max_workers=TRANSLATE_MAX_WORKERS,
+            stats=job.stats,
+            batch_translate_func=batch_translate_wrapper if BATCH_ENABLED else None,
+            batch_token_budget=BATCH_TOKEN_BUDGET,
+            batch_max_segments=BATCH_MAX_SEGMENTS,
+            batch_segment_max_tokens=BATCH_SEGMENT_MAX_TOKENS,
+            xlsx_stream_threshold=int(XLSX_STREAM_THRESHOLD_MB * 1024 * 1024),
+            skip_untranslatable=SKIP_FILTER_ENABLED,
+            progress_callback=job.update_progress,
+            cancel_event=job.cancel_event,
+            checkpoint=checkpoint,
+            timer=phase_timer,
+            context_window=context_window_for(translation_mode)
+        )
+        
+        started = time.perf_counter()
+        if target_langs and len(target_langs) > 1:
+            # 每种目标语言的译文写回后立即保存，最后打包为zip
+            stem, ext = os.path.splitext(filename)
+            target_codes = {name: code for code, name in target_langs}
+            output_files = []
+            
+            def save_target(target_name, translated_content, file_type):
+                target_file_path = os.path.join(job.work_dir, f"translated_{stem}_{target_codes[target_name]}{ext}")
+                with phase_timer('save'):
+                    save_translated_file(translated_content, file_type, target_file_path)
+                output_files.append(target_file_path)
+            
+            process_file_targets(
+                input_path,
+                source_lang,
+                [name for _, name in target_langs],
+                translate_wrapper,
+                on_target=save_target,
+                **process_options
+            )
+            
+            output_filename = f"translated_{stem}.zip"
+            output_file_path = os.path.join(job.work_dir, output_filename)
+            with phase_timer('save'):
+                with zipfile.ZipFile(output_file_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                    for target_file_path in output_files:
+                        archive.write(target_file_path, os.path.basename(target_file_path))
+                for target_file_path in output_files:
+                    os.remove(target_file_path)
+        else:
+            # 处理文件并获取翻译后的内容
+            translated_content, file_type = process_file(
+                input_path, 
+                source_lang, 
+                target_lang, 
+                translate_wrapper,
+                **process_options
+            )
+            
+            # 保存翻译后的文件
+            output_filename = f"translated_{filename}"
+            output_file_path = os.path.join(job.work_dir, output_filename)
+            with phase_timer('save'):
+                save_translated_file(translated_content, file_type, output_file_path)
+        
+        # 除翻译、写回和保存外的时间为文档解析
+        parse_seconds = time.perf_counter() - started - sum(job.timings.get(phase, 0) for phase in ('translate', 'write_back', 'save'))
+        job.add_time('parse', parse_seconds)
+        REGISTRY.observe('translate_job_phase_seconds', parse_seconds, phase='parse')
+    except BaseException:
+        checkpoint.close()
+        raise
+    
+    # 翻译完成后删除检查点和原始文件
+    checkpoint.remove()
+    if os.path.exists(input_path):
+        os.remove(input_path)
+    
+    # 返回翻译后的文件名供下载
+    return {
+        'filename': output_filename,
+        'translation_memory': TRANSLATION_MEMORY.stats() if TRANSLATION_MEMORY else None
+    }
+
+# 执行批量翻译任务：source为zip压缩包或目录，文档按解析、翻译、保存的流水线处理
+# 所有文档共用一个翻译线程池、翻译记忆和批次内的译文去重，API限流由API_CLIENT全局控制
+# 译文按目标语言分目录保存在output_dir中，并写入包含每个文件状态和耗时的批量报告；
+# 指定output_name时把输出目录打包为任务工作目录中的zip文件供下载；file_callback(报告项)在每个文件结束后调用
+def run_batch_job(job, source, source_lang, target_langs, prompt_step1, prompt_step2, api_key, api_base, model,
+                  refine_policy=None, refine_min_chars=None, output_dir=None, output_name=None, file_callback=None,
+                  translation_mode=None, glossary=None):
+    translate_wrapper, batch_translate_wrapper = make_translate_funcs(
+        job, prompt_step1, prompt_step2, api_key, api_base, model, refine_policy, refine_min_chars, translation_mode, glossary
+    )
+    extract_dir = os.path.join(job.work_dir, 'input')
+    output_dir = output_dir or os.path.join(job.work_dir, 'output')
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with timed('translate_job_phase_seconds', job, 'extract', phase='extract'):
+        files = collect_batch_files(
+            source, extract_dir, ALLOWED_EXTENSIONS, BULK_MAX_FILES, int(BULK_MAX_EXTRACT_MB * 1024 * 1024)
+        )
+    if not files:
+        raise ValueError('没有找到可翻译的文件')
+    
+    # 进度按文件数统计
+    job.update_progress(0, len(files))
+    progress_lock = threading.Lock()
+    finished = []
+    
+    def file_done(item):
+        job.incr(f"files_{item['status']}")
+        for key in ('segments', 'unique_segments', 'skipped_segments'):
+            job.incr(key, item.get(key, 0))
+        with progress_lock:
+            finished.append(item['file'])
+            done = len(finished)
+        job.update_progress(done, len(files))
+        if file_callback:
+            file_callback(item)
+    
+    pipeline = BatchPipeline(
+        translate_wrapper,
+        batch_translate_wrapper if BATCH_ENABLED else None,
+        parse_workers=BULK_PARSE_WORKERS,
+        save_workers=BULK_SAVE_WORKERS,
+        translate_workers=BULK_TRANSLATE_WORKERS,
+        xlsx_stream_threshold=int(XLSX_STREAM_THRESHOLD_MB * 1024 * 1024),
+        batch_token_budget=BATCH_TOKEN_BUDGET,
+        batch_max_segments=BATCH_MAX_SEGMENTS,
+        batch_segment_max_tokens=BATCH_SEGMENT_MAX_TOKENS,
+        skip_untranslatable=SKIP_FILTER_ENABLED,
+        context_window=context_window_for(translation_mode)
+    )
+    with timed('translate_job_phase_seconds', job, 'pipeline', phase='pipeline'):
+        report = pipeline.run(files, output_dir, source_lang, target_langs, file_callback=file_done, cancel_event=job.cancel_event)
+    job.check_cancelled()
+    
+    if output_name:
+        with timed('translate_job_phase_seconds', job, 'save', phase='save'):
+            zip_directory(output_dir, os.path.join(job.work_dir, output_name))
+        shutil.rmtree(output_dir, ignore_errors=True)
+    shutil.rmtree(extract_dir, ignore_errors=True)
+    
+    return {
+        'filename': output_name,
+        'report': report,
+        'translation_memory': TRANSLATION_MEMORY.stats() if TRANSLATION_MEMORY else None
+    }
+
+# 读取翻译表单中的语言、提示词、API配置和纠错策略，参数无效时抛出ValueError
+# 目标语言可以多选（重复的target_lang字段或逗号分隔），target_langs为[语言代码, 语言名称]列表
+# 上传的术语表（glossary字段）读取为{目标语言名称: [[原文术语, 译文术语], ...]}
+def read_translation_form():
+    # 获取表单数据
+    source_lang_code = request.form.get('source_lang')
+    target_lang_codes = list(dict.fromkeys(
+        code.strip() for value in request.form.getlist('target_lang') for code in value.split(',') if code.strip()
+    ))
+    if not target_lang_codes:
+        raise ValueError('未选择目标语言')
+    
+    # 获取第二步纠错策略
+    refine_policy = request.form.get('refine_policy') or DEFAULT_REFINE_POLICY
+    if refine_policy not in REFINE_POLICIES:
+        raise ValueError('不支持的纠错策略')
+    try:
+        refine_min_chars = int(request.form.get('refine_min_chars') or DEFAULT_REFINE_MIN_CHARS)
+    except ValueError:
+        raise ValueError('纠错字符数阈值必须是整数')
+    
+    # 获取翻译模式和术语表
+    translation_mode = request.form.get('translation_mode') or DEFAULT_TRANSLATION_MODE
+    if translation_mode not in TRANSLATION_MODES:
+        raise ValueError('不支持的翻译模式')
+    glossary = None
+    glossary_file = request.files.get('glossary')
+    if glossary_file is not None and glossary_file.filename:
+        languages = {}
+        for lang in SUPPORTED_LANGUAGES:
+            languages[lang['code']] = lang['name']
+            languages[lang['name']] = lang['name']
+        try:
+            glossary = load_glossary(glossary_file.stream, glossary_file.filename, languages, GLOSSARY_MAX_TERMS)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f'无法读取术语表: {str(e)}')
+    
+    # 验证语言代码
+    target_langs = [
+        [code, next((lang['name'] for lang in SUPPORTED_LANGUAGES if lang['code'] == code), code)]
+        for code in target_lang_codes
+    ]
+    return {
+        'source_lang': next((lang['name'] for lang in SUPPORTED_LANGUAGES if lang['code'] == source_lang_code), source_lang_code),
+        'target_lang': target_langs[0][1],
+        'target_langs': target_langs,
+        # 从表单获取自定义提示词（如果有）
+        'prompt_step1': request.form.get('prompt_step1'),
+        'prompt_step2': request.form.get('prompt_step2'),
+        # 获取API配置（来自表单或使用默认值）
+        'api_key': request.form.get('api_key', DEFAULT_OPENAI_API_KEY),
+        'api_base': request.form.get('api_base', DEFAULT_OPENAI_API_BASE),
+        'model': request.form.get('model', DEFAULT_OPENAI_MODEL),
+        'refine_policy': refine_policy,
+        'refine_min_chars': refine_min_chars,
+        'translation_mode': translation_mode,
+        'glossary': glossary
+    }
 
 # 翻译文件路由
 @app.route('/translate', methods=['POST'])
@@ -248,15 +1067,8 @@ def translate_file():
         # 获取当前登录用户的userid
         userid = session.get('userid')
         
-        # 发送账号信息到验证API，记录翻译行为
-        try:
-            requests.post(
-                AUTH_API_URL,
-                json={'Userid': userid, 'Action': 'translate'}
-            )
-        except Exception as e:
-            # 如果发送账号信息失败，不影响翻译功能的正常运行
-            print(f"发送账号信息失败: {str(e)}")
+        # 发送账号信息到验证API，记录翻译行为；由后台线程发送，发送失败不影响翻译功能的正常运行
+        AUDIT_QUEUE.submit({'Userid': userid, 'Action': 'translate'})
             
         # 检查是否有文件上传
         if 'file' not in request.files:
@@ -272,98 +1084,257 @@ def translate_file():
         if not allowed_file(file.filename):
             return jsonify({'error': '不支持的文件类型'}), 400
         
-        # 获取表单数据
-        source_lang_code = request.form.get('source_lang')
-        target_lang_code = request.form.get('target_lang')
+        try:
+            form = read_translation_form()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 从表单获取自定义提示词（如果有）
-        prompt_step1 = request.form.get('prompt_step1')
-        prompt_step2 = request.form.get('prompt_step2')
+        filename = original_filename(file.filename)
+        if not filename:
+            return jsonify({'error': '文件名无效'}), 400
         
-        # 获取API配置（来自表单或使用默认值）
-        api_key = request.form.get('api_key', DEFAULT_OPENAI_API_KEY)
-        api_base = request.form.get('api_base', DEFAULT_OPENAI_API_BASE)
-        model = request.form.get('model', DEFAULT_OPENAI_MODEL)
+        # 保存上传的文件到任务的工作目录，任务中断后可以继续翻译；文件以原扩展名保存，译文使用原始文件名
+        job_id = uuid.uuid4().hex
+        job_dir = JOB_MANAGER.job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = os.path.join(job_dir, 'source' + os.path.splitext(filename)[1].lower())
+        file.save(input_path)
         
-        # 验证语言代码
-        source_lang = next((lang['name'] for lang in SUPPORTED_LANGUAGES if lang['code'] == source_lang_code), source_lang_code)
-        target_lang = next((lang['name'] for lang in SUPPORTED_LANGUAGES if lang['code'] == target_lang_code), target_lang_code)
+        # 创建后台翻译任务，立即返回任务ID
+        def job_func(job):
+            return run_translation_job(
+                job,
+                input_path,
+                filename,
+                form['source_lang'],
+                form['target_lang'],
+                form['prompt_step1'],
+                form['prompt_step2'],
+                form['api_key'],
+                form['api_base'],
+                form['model'],
+                form['refine_policy'],
+                form['refine_min_chars'],
+                form['target_langs'],
+                form['translation_mode'],
+                form['glossary']
+            )
+        job = JOB_MANAGER.submit(job_func, owner=userid, job_id=job_id)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('job_status', job_id=job.id)
+        }), 202
+    
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# 批量翻译路由：上传包含多个文档的zip压缩包，译文按目标语言分目录保存，和批量报告一起打包为zip下载
+@app.route('/batch', methods=['POST'])
+@login_required
+def translate_batch_upload():
+    try:
+        userid = session.get('userid')
         
-        # 保存上传的文件到临时目录
-        filename = secure_filename(file.filename)
-        temp_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(temp_file_path)
+        file = request.files.get('file')
+        if file is None or file.filename == '':
+            return jsonify({'error': '没有文件上传'}), 400
+        if not file.filename.lower().endswith('.zip'):
+            return jsonify({'error': '批量翻译只支持zip压缩包'}), 400
         
         try:
-            # 创建一个包装函数，传递API配置参数和两步翻译流程
-            def translate_wrapper(text, source, target, prompt=None):
-                # prompt参数在这里不会使用，因为我们需要两个不同的提示词
-                return two_step_translation(
-                    text, 
-                    source, 
-                    target, 
-                    prompt_step1, 
-                    prompt_step2, 
-                    api_key, 
-                    api_base, 
-                    model
-                )
-            
-            # 处理文件并获取翻译后的内容
-            translated_content, file_type = process_file(
-                temp_file_path, 
-                source_lang, 
-                target_lang, 
-                translate_wrapper
+            form = read_translation_form()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 保存上传的压缩包到任务的工作目录，结果压缩包使用原始文件名
+        filename = original_filename(file.filename) or 'batch.zip'
+        job_id = uuid.uuid4().hex
+        job_dir = JOB_MANAGER.job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        input_path = os.path.join(job_dir, 'source.zip')
+        file.save(input_path)
+        if not zipfile.is_zipfile(input_path):
+            JOB_MANAGER.remove_job_dir(job_id)
+            return jsonify({'error': '无法读取zip压缩包'}), 400
+        
+        def job_func(job):
+            result = run_batch_job(
+                job,
+                input_path,
+                form['source_lang'],
+                form['target_langs'],
+                form['prompt_step1'],
+                form['prompt_step2'],
+                form['api_key'],
+                form['api_base'],
+                form['model'],
+                form['refine_policy'],
+                form['refine_min_chars'],
+                output_name=f"translated_{filename}",
+                translation_mode=form['translation_mode'],
+                glossary=form['glossary']
             )
-            
-            # 保存翻译后的文件
-            output_filename = f"translated_{filename}"
-            output_file_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-            save_translated_file(translated_content, file_type, output_file_path)
-            
-            # 返回翻译后的文件路径供下载
-            return jsonify({
-                'success': True,
-                'file_path': output_file_path,
-                'filename': output_filename
-            })
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
+            os.remove(input_path)
+            return result
+        job = JOB_MANAGER.submit(job_func, owner=userid, job_id=job_id)
+        
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('job_status', job_id=job.id)
+        }), 202
     
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# 文件下载路由
-@app.route('/download/<path:filename>')
+# 读取当前用户的任务状态（本进程或其他工作进程中的任务），任务不存在或不属于当前用户时返回None
+def load_user_job_state(job_id):
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return None
+    state = JOB_MANAGER.load_state(job_id)
+    if state is None or state.get('owner') != session.get('userid'):
+        return None
+    return state
+
+# 查询翻译任务状态路由
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    state = load_user_job_state(job_id)
+    if state is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    data = {key: value for key, value in state.items() if key not in ('owner', 'pid', 'updated_at')}
+    if data['status'] == JOB_COMPLETED:
+        data['download_url'] = url_for('download_file', job_id=job_id)
+    elif data['status'] in (JOB_FAILED, JOB_CANCELLED) and load_job_checkpoint(job_id) is not None:
+        data['resumable'] = True
+        data['resume_url'] = url_for('resume_job', job_id=job_id)
+    return jsonify(data)
+
+# 取消翻译任务路由；任务在其他工作进程中执行时通过取消标记文件通知
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
 @login_required
-def download_file(filename):
+def cancel_job(job_id):
+    state = load_user_job_state(job_id)
+    if state is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    job = JOB_MANAGER.get(job_id)
+    if job is not None:
+        job.cancel()
+    else:
+        request_cancel(JOB_MANAGER.job_dir(job_id))
+    return jsonify({'success': True, 'job_id': job_id})
+
+# Prometheus指标路由；需要以METRICS_TOKEN为Bearer令牌访问，未设置令牌时关闭（METRICS_PUBLIC为1时不校验）
+@app.route('/metrics')
+def metrics():
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+            return jsonify({'error': '未授权'}), 401
+    elif not METRICS_PUBLIC:
+        return jsonify({'error': '未设置METRICS_TOKEN，/metrics已关闭'}), 404
+    
+    counts = JOB_MANAGER.count_by_status()
+    for status in (JOB_QUEUED, JOB_RUNNING, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED):
+        REGISTRY.set('translate_jobs', counts.get(status, 0), status=status)
+    if TRANSLATION_MEMORY:
+        for name, value in TRANSLATION_MEMORY.stats().items():
+            REGISTRY.set(f'translate_memory_{name}', value)
+    REGISTRY.set('translate_audit_queue', AUDIT_QUEUE.pending())
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+# 读取任务检查点中的任务参数，检查点不存在时返回None
+def load_job_checkpoint(job_id):
+    return load_checkpoint_metadata(JOB_MANAGER.job_dir(job_id))
+
+# 继续翻译中断的任务路由：从检查点中第一个未完成的片段开始
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_job(job_id):
+    userid = session.get('userid')
+    state = load_user_job_state(job_id)
+    if state is None:
+        return jsonify({'error': '任务不存在'}), 404
+    if state['status'] in (JOB_QUEUED, JOB_RUNNING):
+        return jsonify({'error': '任务正在进行中'}), 409
+    
+    metadata = load_job_checkpoint(job_id)
+    if metadata is None:
+        return jsonify({'error': '没有可继续的任务'}), 404
+    if not os.path.exists(metadata['input_path']):
+        return jsonify({'error': '原始文件已删除，无法继续翻译'}), 410
+    
+    api_key = request.form.get('api_key', DEFAULT_OPENAI_API_KEY)
+    
+    def job_func(job):
+        return run_translation_job(
+            job,
+            metadata['input_path'],
+            metadata['filename'],
+            metadata['source_lang'],
+            metadata['target_lang'],
+            metadata['prompt_step1'],
+            metadata['prompt_step2'],
+            api_key,
+            metadata['api_base'],
+            metadata['model'],
+            metadata['refine_policy'],
+            metadata['refine_min_chars'],
+            metadata.get('target_langs'),
+            metadata.get('translation_mode'),
+            metadata.get('glossary')
+        )
+    # 上面的状态检查和提交之间可能有其他请求继续了同一任务，由resume原子地检查和提交，只有一个请求成功
+    job = JOB_MANAGER.resume(job_func, owner=userid, job_id=job_id)
+    if job is None:
+        return jsonify({'error': '任务正在进行中'}), 409
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id)
+    }), 202
+
+# 文件下载路由：下载完成后删除任务的工作目录
+@app.route('/jobs/<job_id>/download')
+@login_required
+def download_file(job_id):
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        state = load_user_job_state(job_id)
+        if state is None or state['status'] != JOB_COMPLETED:
+            return jsonify({'error': '文件不存在'}), 404
+        
+        filename = state['filename']
+        file_path = os.path.join(JOB_MANAGER.job_dir(job_id), filename)
         if not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 404
         
-        # 发送文件并设置下载完成后删除
         response = send_file(file_path, as_attachment=True, download_name=filename)
         
-        # 注册一个回调函数，在响应发送后删除文件
+        # 注册一个回调函数，在响应发送后删除工作目录
         @response.call_on_close
-        def cleanup(): 
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
+        def cleanup():
+            JOB_MANAGER.remove_job_dir(job_id)
         
         return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# 主函数
+# 上传文件超过大小限制
+@app.errorhandler(413)
+def request_entity_too_large(e):
+    return jsonify({'error': f'文件大小超过{request.max_content_length / (1024 * 1024):g}MB限制'}), 413
+
 if __name__ == '__main__':
     # 确保uploads文件夹存在
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    # 绑定到0.0.0.0:5000，使应用在内网可访问
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # 开发服务器，绑定到0.0.0.0:5000，使应用在内网可访问；生产环境请使用gunicorn启动wsgi:app
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG') == '1')
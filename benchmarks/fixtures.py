@@ -0,0 +1,119 @@
+import os
+import random
+
+import docx
+import openpyxl
+import pptx
+from pptx.util import Inches, Pt
+
+# 生成基准测试用的DOCX/XLSX/PPTX文件，内容为可重复的随机英文句子，
+# 其中一部分为重复文本（页脚、表头等）和数字、编号，用于覆盖去重和本地跳过的路径
+
+# 各规模的文档参数
+SIZES = {
+    'small': {'paragraphs': 50, 'tables': 2, 'rows': 50, 'cols': 8, 'sheets': 1, 'slides': 10},
+    'medium': {'paragraphs': 500, 'tables': 10, 'rows': 500, 'cols': 20, 'sheets': 2, 'slides': 60},
+    'large': {'paragraphs': 3000, 'tables': 40, 'rows': 3000, 'cols': 30, 'sheets': 3, 'slides': 300},
+}
+
+_WORDS = (
+    'contract party agreement service delivery payment invoice schedule quality report customer supplier '
+    'warranty period notice term condition product price order shipment review approval budget project '
+    'team meeting summary result analysis market revenue growth risk plan update'
+).split()
+
+def _sentence(rng, min_words=6, max_words=18):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+def _paragraph(rng, sentences=3):
+    return ' '.join(_sentence(rng) for _ in range(rng.randint(1, sentences)))
+
+# 表格单元格内容：文本、数字、编号和少量重复的表头
+def _cell_text(rng, row, col):
+    if row == 0:
+        return f'Column {col}'
+    kind = rng.random()
+    if kind < 0.2:
+        return str(rng.randint(1, 100000))
+    if kind < 0.3:
+        return f'PO-{rng.randint(1000, 9999)}'
+    if kind < 0.45:
+        return rng.choice(('Approved', 'Pending', 'Rejected', 'In progress'))
+    return _sentence(rng, 2, 8)
+
+def make_docx(path, paragraphs=50, tables=2, rows=50, cols=8, seed=0, **_):
+    rng = random.Random(seed)
+    doc = docx.Document()
+    section = doc.sections[0]
+    section.header.paragraphs[0].text = 'Confidential - Internal use only'
+    section.footer.paragraphs[0].text = 'Company Name Ltd.'
+
+    table_every = max(1, paragraphs // max(1, tables))
+    for index in range(paragraphs):
+        if index % 20 == 0:
+            doc.add_heading(_sentence(rng, 3, 6), level=1)
+        paragraph = doc.add_paragraph()
+        # 部分段落包含多种格式的run
+        run = paragraph.add_run(_sentence(rng) + ' ')
+        if index % 3 == 0:
+            run.bold = True
+        paragraph.add_run(_paragraph(rng))
+        if index % table_every == table_every - 1 and tables:
+            table = doc.add_table(rows=min(rows, 20), cols=min(cols, 6))
+            for row_index, row in enumerate(table.rows):
+                for col_index, cell in enumerate(row.cells):
+                    cell.text = _cell_text(rng, row_index, col_index)
+    doc.save(path)
+    return path
+
+def make_xlsx(path, rows=50, cols=8, sheets=1, seed=0, **_):
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook()
+    for sheet_index in range(sheets):
+        ws = wb.active if sheet_index == 0 else wb.create_sheet()
+        ws.title = f'Sheet{sheet_index + 1}'
+        for row in range(rows):
+            ws.append([_cell_text(rng, row, col) for col in range(cols)])
+    wb.save(path)
+    return path
+
+def make_pptx(path, slides=10, seed=0, **_):
+    rng = random.Random(seed)
+    prs = pptx.Presentation()
+    for index in range(slides):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = _sentence(rng, 3, 7)
+        body = slide.placeholders[1].text_frame
+        body.text = _sentence(rng)
+        for _ in range(rng.randint(2, 5)):
+            body.add_paragraph().text = _sentence(rng)
+
+        # 每张幻灯片重复的页脚
+        footer = slide.shapes.add_textbox(Inches(0.5), Inches(7), Inches(6), Inches(0.4))
+        footer.text_frame.text = 'Company Name Ltd. | Confidential'
+        footer.text_frame.paragraphs[0].runs[0].font.size = Pt(10)
+
+        if index % 5 == 4:
+            table = slide.shapes.add_table(4, 3, Inches(1), Inches(4.5), Inches(6), Inches(1.5)).table
+            for row in range(4):
+                for col in range(3):
+                    table.cell(row, col).text = _cell_text(rng, row, col)
+        if index % 2 == 0:
+            slide.notes_slide.notes_text_frame.text = _paragraph(rng)
+    prs.save(path)
+    return path
+
+FORMATS = {
+    'docx': make_docx,
+    'xlsx': make_xlsx,
+    'pptx': make_pptx,
+}
+
+# 生成（或复用已生成的）基准测试文件，返回文件路径
+def fixture_path(directory, file_format, size):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{size}.{file_format}')
+    if not os.path.exists(path):
+        FORMATS[file_format](path, **SIZES[size])
+    return path
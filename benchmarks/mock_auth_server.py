@@ -0,0 +1,125 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本地模拟的账号验证服务，用于在没有API网关和数据库的情况下测试登录和审计事件
+# 登录请求（包含UserPasswd）返回1（通过）、0（账号或密码不正确）或-1（系统故障）；
+# 审计事件（包含Action，单个对象或JSON数组）返回1并记录；支持配置响应延迟和故障比例
+
+# 请求计数和收到的审计事件
+class MockAuthStats:
+    def __init__(self):
+        self.logins = 0
+        self.audit_requests = 0
+        self.events = []
+        self._lock = threading.Lock()
+
+    def record_login(self):
+        with self._lock:
+            self.logins += 1
+
+    def record_events(self, events):
+        with self._lock:
+            self.audit_requests += 1
+            self.events.extend(events)
+
+    def reset(self):
+        with self._lock:
+            self.logins = 0
+            self.audit_requests = 0
+            self.events = []
+
+    def to_dict(self):
+        with self._lock:
+            return {'logins': self.logins, 'audit_requests': self.audit_requests, 'audit_events': len(self.events)}
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+
+            if isinstance(body, dict) and 'UserPasswd' in body:
+                server.stats.record_login()
+                if server.failure_rate and random.random() < server.failure_rate:
+                    self._send_json(-1)
+                elif server.users is None or server.users.get(body.get('Userid')) == body['UserPasswd']:
+                    self._send_json(1)
+                else:
+                    self._send_json(0)
+                return
+
+            server.stats.record_events(body if isinstance(body, list) else [body])
+            self._send_json(1)
+
+        # 查询统计信息
+        def do_GET(self):
+            self._send_json(server.stats.to_dict())
+
+        def _send_json(self, data, status=200):
+            payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+# 模拟验证服务：users为{账号: 密码}，为None时接受任意账号密码；latency为平均响应延迟（秒），
+# jitter为延迟的随机波动范围，failure_rate为登录请求返回-1的比例
+class MockAuthServer:
+    def __init__(self, host='127.0.0.1', port=0, users=None, latency=0.05, jitter=0.0, failure_rate=0.0):
+        self.users = users
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stats = MockAuthStats()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-auth', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='启动本地模拟的账号验证服务')
+    parser.add_argument('--port', type=int, default=18081)
+    parser.add_argument('--users', help='逗号分隔的“账号:密码”，不指定时接受任意账号密码')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    users = None
+    if args.users:
+        users = dict(item.split(':', 1) for item in args.users.split(',') if ':' in item)
+    server = MockAuthServer(
+        port=args.port, users=users, latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate
+    ).start()
+    print(f"模拟验证服务已启动: {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
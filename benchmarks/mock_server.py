@@ -0,0 +1,158 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本地模拟的OpenAI兼容chat/completions服务，用于在没有真实模型的情况下测量翻译流程的吞吐量
+# 支持配置响应延迟、抖动和429限流比例；译文为原文加前缀，保留行内标记和批量翻译的JSON格式
+
+_TAG_RE = re.compile(r'</?g\d+>')
+
+# 生成模拟译文：批量请求返回键相同的JSON，第二步纠错返回初步翻译，其他请求在原文前加前缀
+def mock_translate(user_content, prefix='译:'):
+    try:
+        payload = json.loads(user_content)
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict):
+        result = {
+            key: value['draft'] if isinstance(value, dict) else prefix + value
+            for key, value in payload.items()
+        }
+        return json.dumps(result, ensure_ascii=False)
+
+    if user_content.startswith('原文:') and '\n\n初步翻译: ' in user_content:
+        return user_content.split('\n\n初步翻译: ', 1)[1]
+
+    # 带行内标记的文本把前缀放进第一个标记内，保持标记结构不变
+    match = _TAG_RE.match(user_content)
+    if match:
+        return user_content[:match.end()] + prefix + user_content[match.end():]
+    return prefix + user_content
+
+# 请求计数和统计
+class MockStats:
+    def __init__(self):
+        self.calls = 0
+        self.rate_limited = 0
+        self.prompt_chars = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt_chars=0, rate_limited=False):
+        with self._lock:
+            if rate_limited:
+                self.rate_limited += 1
+            else:
+                self.calls += 1
+                self.prompt_chars += prompt_chars
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.rate_limited = 0
+            self.prompt_chars = 0
+
+    def to_dict(self):
+        with self._lock:
+            return {'calls': self.calls, 'rate_limited': self.rate_limited, 'prompt_chars': self.prompt_chars}
+
+def _make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            if 'messages' not in body:
+                # 账号验证等其他接口直接返回成功
+                self._send_json({'success': True})
+                return
+
+            if server.rate_429 and random.random() < server.rate_429:
+                server.stats.record(rate_limited=True)
+                self._send_json({'error': {'message': 'rate limited'}}, status=429, headers={'Retry-After': str(server.retry_after)})
+                return
+
+            user_content = body['messages'][-1]['content']
+            server.stats.record(prompt_chars=sum(len(message['content']) for message in body['messages']))
+            time.sleep(max(0.0, server.latency + random.uniform(-server.jitter, server.jitter)))
+            content = mock_translate(user_content)
+
+            if body.get('stream'):
+                self._send_stream(content)
+            else:
+                self._send_json({
+                    'choices': [{'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': len(user_content), 'completion_tokens': len(content)}
+                })
+
+        def _send_json(self, data, status=200, headers=None):
+            payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_stream(self, content):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            for start in range(0, len(content), 16):
+                chunk = {'choices': [{'delta': {'content': content[start:start + 16]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.write(b'data: [DONE]\n\n')
+            self.close_connection = True
+
+    return Handler
+
+# 模拟服务：latency为平均响应延迟（秒），jitter为延迟的随机波动范围，rate_429为返回429的请求比例
+class MockServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, jitter=0.02, rate_429=0.0, retry_after=0.1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.stats = MockStats()
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='启动本地模拟的OpenAI兼容服务')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockServer(port=args.port, latency=args.latency, jitter=args.jitter, rate_429=args.rate_429).start()
+    print(f"模拟服务已启动: {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fixtures import FORMATS, SIZES, fixture_path
+from benchmarks.mock_server import MockServer
+
+try:
+    import resource
+except ImportError:
+    # Windows下没有resource模块，不统计内存峰值
+    resource = None
+
+# 翻译流程基准测试：启动本地模拟服务，对各格式、各规模的文档执行完整的翻译任务，
+# 输出片段数、每秒片段数、每个文档的API调用次数、内存峰值和端到端耗时
+#
+#     python benchmarks/run.py --formats docx,pptx --sizes small,medium --latency 0.2
+
+# 当前进程的内存峰值（MB）
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS单位为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+# 在子进程中执行一个测试用例，保证内存峰值互不影响
+def run_case(file_format, size, fixture_dir, work_dir, api_base, env, queue):
+    try:
+        os.environ.update(env)
+        os.environ['OPENAI_API_BASE'] = api_base
+        os.environ['JOBS_DIR'] = os.path.join(work_dir, 'jobs')
+
+        import app
+        from utils.job_manager import Job
+
+        source_path = fixture_path(fixture_dir, file_format, size)
+        filename = f'bench_{size}.{file_format}'
+        job = Job(owner='benchmark')
+        job.work_dir = app.JOB_MANAGER.job_dir(job.id)
+        os.makedirs(job.work_dir, exist_ok=True)
+        input_path = os.path.join(job.work_dir, filename)
+        shutil.copyfile(source_path, input_path)
+
+        rss_before = peak_rss_mb()
+        started = time.perf_counter()
+        app.run_translation_job(
+            job, input_path, filename, '英文', '中文', None, None,
+            os.environ.get('OPENAI_API_KEY', 'benchmark'), api_base, 'mock-model'
+        )
+        elapsed = time.perf_counter() - started
+
+        app.JOB_MANAGER.remove_job_dir(job.id)
+
+        segments = job.stats.get('segments', 0)
+        queue.put({
+            'format': file_format,
+            'size': size,
+            'file_kb': round(os.path.getsize(source_path) / 1024, 1),
+            'segments': segments,
+            'unique_segments': job.stats.get('unique_segments', 0),
+            'skipped_segments': job.stats.get('skipped_segments', 0),
+            'seconds': round(elapsed, 3),
+            'segments_per_sec': round(segments / elapsed, 1) if elapsed else None,
+            'rss_before_mb': rss_before,
+            'peak_rss_mb': peak_rss_mb()
+        })
+    except Exception as e:
+        queue.put({'format': file_format, 'size': size, 'error': repr(e)})
+
+def print_table(results):
+    columns = [
+        ('format', '格式'), ('size', '规模'), ('file_kb', '文件KB'), ('segments', '片段'), ('unique_segments', '去重后'),
+        ('api_calls', 'API调用'), ('rate_limited', '429次数'), ('seconds', '耗时s'), ('segments_per_sec', '片段/s'),
+        ('peak_rss_mb', '内存峰值MB')
+    ]
+    rows = [[title for _, title in columns]]
+    for result in results:
+        if 'error' in result:
+            rows.append([result['format'], result['size'], '失败: ' + result['error']])
+        else:
+            rows.append(['' if result.get(key) is None else str(result.get(key)) for key, _ in columns])
+    widths = [max(len(row[index]) for row in rows if index < len(row)) for index in range(len(columns))]
+    for row in rows:
+        print('  '.join(cell.ljust(widths[index]) for index, cell in enumerate(row)).rstrip())
+
+def main():
+    parser = argparse.ArgumentParser(description='文档翻译流程基准测试')
+    parser.add_argument('--formats', default=','.join(FORMATS), help='逗号分隔的文件格式')
+    parser.add_argument('--sizes', default='small,medium', help=f"逗号分隔的文档规模：{','.join(SIZES)}")
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟服务的平均响应延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.02, help='响应延迟的随机波动范围（秒）')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='返回429的请求比例')
+    parser.add_argument('--repeat', type=int, default=1, help='每个用例重复次数')
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'translate4original_bench'),
+                        help='测试文件目录（已存在的文件会被复用）')
+    parser.add_argument('--tm', action='store_true', help='启用翻译记忆（默认关闭，避免重复运行时直接命中缓存）')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE', help='传给应用的环境变量，可多次指定')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    env = {
+        'OPENAI_API_KEY': 'benchmark',
+        'TM_ENABLED': '1' if args.tm else '0',
+        'API_MAX_RETRIES': os.getenv('API_MAX_RETRIES', '8'),
+    }
+    for item in args.env:
+        name, _, value = item.partition('=')
+        env[name] = value
+
+    server = MockServer(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429).start()
+    context = multiprocessing.get_context('spawn')
+    results = []
+    try:
+        for size in args.sizes.split(','):
+            for file_format in args.formats.split(','):
+                # 在父进程中生成测试文件，不计入用例耗时和内存
+                fixture_path(args.fixtures, file_format, size)
+                for _ in range(args.repeat):
+                    server.stats.reset()
+                    work_dir = tempfile.mkdtemp(prefix='translate4original_bench_')
+                    queue = context.Queue()
+                    process = context.Process(
+                        target=run_case,
+                        args=(file_format, size, args.fixtures, work_dir, server.url, env, queue)
+                    )
+                    process.start()
+                    result = queue.get()
+                    process.join()
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+                    mock_stats = server.stats.to_dict()
+                    result['api_calls'] = mock_stats['calls']
+                    result['rate_limited'] = mock_stats['rate_limited']
+                    result['prompt_chars'] = mock_stats['prompt_chars']
+                    results.append(result)
+    finally:
+        server.stop()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
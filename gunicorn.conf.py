@@ -0,0 +1,32 @@
+import os
+import secrets
+
+from dotenv import load_dotenv
+
+# gunicorn配置：gunicorn -c gunicorn.conf.py wsgi:app
+# 任务状态、检查点和译文都保存在JOBS_DIR下的任务工作目录中，多个工作进程之间共享
+
+# 主进程也读取.env文件，使WEB_*配置和SECRET_KEY在fork工作进程之前生效
+load_dotenv()
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:5000')
+# 工作进程数
+workers = int(os.getenv('WEB_WORKERS', '2'))
+# 每个工作进程的线程数，用于同时处理上传、下载和任务状态轮询
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '8'))
+# 上传和下载大文件需要较长的超时
+timeout = int(os.getenv('WEB_TIMEOUT', '300'))
+graceful_timeout = 30
+# 不预加载应用：每个工作进程在fork之后各自创建任务线程池和清理线程
+preload_app = False
+accesslog = '-'
+
+# 主进程启动时执行：没有配置SECRET_KEY时生成一个，所有工作进程继承同一个会话密钥，
+# 否则每个工作进程各自随机生成密钥，其他工作进程签发的会话会被拒绝；
+# 同时记录工作进程数，应用按此把API_RATE_LIMIT平均分配给各工作进程
+def on_starting(server):
+    if not os.getenv('SECRET_KEY'):
+        os.environ['SECRET_KEY'] = secrets.token_hex(32)
+        server.log.warning('未配置SECRET_KEY，已生成临时会话密钥，重启后所有用户需要重新登录')
+    os.environ['WEB_WORKER_COUNT'] = str(server.cfg.workers)
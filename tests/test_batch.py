@@ -0,0 +1,41 @@
+import json
+import os
+import zipfile
+
+import docx
+
+from utils.batch import BATCH_REPORT_NAME, FILE_COMPLETED, FILE_SKIPPED, BatchPipeline, collect_batch_files
+
+def fake_translate(text, *args, **kwargs):
+    return f'[{text}]'
+
+def make_docx(path, text):
+    document = docx.Document()
+    document.add_paragraph(text)
+    document.save(path)
+
+# 中文文件名保留在报告和输出路径中，解压的文件使用序号和原扩展名；重名的条目记为跳过
+def test_batch_keeps_original_names(tmp_path):
+    source = str(tmp_path / 'source.docx')
+    make_docx(source, 'Hello')
+    archive_path = str(tmp_path / 'batch.zip')
+    with zipfile.ZipFile(archive_path, 'w') as archive:
+        archive.write(source, '合同/报告.docx')
+        archive.write(source, '合同\\报告.docx')
+        archive.write(source, '../备注.docx')
+
+    extract_dir = str(tmp_path / 'input')
+    files = collect_batch_files(archive_path, extract_dir, {'docx'})
+    assert [(name, error) for name, _, error in files] == [
+        ('合同/报告.docx', None), ('合同/报告.docx', '压缩包中存在同名文件，已跳过'), ('备注.docx', None)
+    ]
+    assert sorted(os.listdir(extract_dir)) == ['0001.docx', '0003.docx']
+
+    output_dir = str(tmp_path / 'output')
+    os.makedirs(output_dir)
+    report = BatchPipeline(fake_translate, translate_workers=2).run(files, output_dir, 'English', [('zh', 'Chinese')])
+    assert [item['status'] for item in report['files']] == [FILE_COMPLETED, FILE_SKIPPED, FILE_COMPLETED]
+    assert report['skipped'] == 1
+    assert docx.Document(os.path.join(output_dir, 'zh', '合同', '报告.docx')).paragraphs[0].text == '[Hello]'
+    with open(os.path.join(output_dir, BATCH_REPORT_NAME), encoding='utf-8') as f:
+        assert json.load(f)['files'][0]['outputs'] == ['zh/合同/报告.docx']
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+from utils.job_manager import JOB_COMPLETED, JOB_FAILED, JOB_RESUME_FILE, JobManager
+
+def wait_finished(manager, job_id):
+    for _ in range(200):
+        if manager.load_state(job_id)['status'] not in ('queued', 'running'):
+            return
+        time.sleep(0.01)
+
+def fail(job):
+    raise RuntimeError('boom')
+
+# 多个请求（两个管理器模拟两个工作进程）同时继续同一任务时只有一个成功，任务结束后可以再次继续
+def test_resume_is_exclusive(tmp_path):
+    managers = [JobManager(jobs_dir=str(tmp_path)), JobManager(jobs_dir=str(tmp_path))]
+    job_id = managers[0].submit(fail, owner='u').id
+    wait_finished(managers[0], job_id)
+    assert managers[0].load_state(job_id)['status'] == JOB_FAILED
+
+    release = threading.Event()
+    runs = []
+
+    def slow(job):
+        runs.append(job.id)
+        release.wait(5)
+        return {'filename': 'out.docx'}
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def resume(manager):
+        barrier.wait()
+        results.append(manager.resume(slow, 'u', job_id))
+
+    threads = [threading.Thread(target=resume, args=(managers[index % 2],)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    resumed = [job for job in results if job is not None]
+    assert len(resumed) == 1
+
+    # 标记在任务状态写入后删除
+    release.set()
+    marker = os.path.join(str(tmp_path), job_id, JOB_RESUME_FILE)
+    for _ in range(200):
+        if not os.path.exists(marker):
+            break
+        time.sleep(0.01)
+    assert not os.path.exists(marker)
+    assert runs == [job_id]
+    assert resumed[0].status == JOB_COMPLETED
+
+# 执行继续翻译的进程已经退出时，残留的标记不会阻止再次继续
+def test_stale_resume_marker_is_reclaimed(tmp_path):
+    manager = JobManager(jobs_dir=str(tmp_path))
+    job_id = manager.submit(fail, owner='u').id
+    wait_finished(manager, job_id)
+    with open(os.path.join(str(tmp_path), job_id, JOB_RESUME_FILE), 'w') as f:
+        f.write('999999999')
+
+    job = manager.resume(lambda job: {}, 'u', job_id)
+    assert job is not None
+    wait_finished(manager, job_id)
+    assert manager.load_state(job_id)['status'] == JOB_COMPLETED
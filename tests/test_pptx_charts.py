@@ -0,0 +1,45 @@
+import pptx
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE
+from pptx.util import Inches
+
+from utils.file_processor import parse_pptx, process_file, save_translated_file
+
+def fake_translate(text, *args, **kwargs):
+    return f'[{text}]'
+
+def make_deck(path):
+    prs = pptx.Presentation()
+    slide = prs.slides.add_slide(prs.slide_layouts[5])
+    slide.shapes.title.text = 'Quarterly report'
+    chart_data = CategoryChartData()
+    chart_data.categories = ['East', 'West']
+    chart_data.add_series('Sales', (1.0, 2.0))
+    chart = slide.shapes.add_chart(
+        XL_CHART_TYPE.COLUMN_CLUSTERED, Inches(1), Inches(1), Inches(6), Inches(4), chart_data
+    ).chart
+    chart.has_title = True
+    chart.chart_title.text_frame.text = 'Revenue by region'
+    prs.save(path)
+
+# 图表标题计入所在幻灯片的片段
+def test_parse_pptx_collects_chart_text(tmp_path):
+    path = str(tmp_path / 'chart.pptx')
+    make_deck(path)
+    stats = {}
+    document = parse_pptx(path, stats)
+    texts = [text for text, _ in document.segments]
+    assert 'Revenue by region' in texts
+    assert 'Quarterly report' in texts
+    assert stats['slide_segments'] == {'1': 2}
+
+# 翻译后的图表标题写回图表部件并随演示文稿保存
+def test_chart_title_is_translated(tmp_path):
+    path = str(tmp_path / 'chart.pptx')
+    output_path = str(tmp_path / 'translated.pptx')
+    make_deck(path)
+    content, file_type = process_file(path, 'en', 'zh', fake_translate)
+    save_translated_file(content, file_type, output_path)
+    
+    chart = next(shape.chart for shape in pptx.Presentation(output_path).slides[0].shapes if shape.has_chart)
+    assert chart.chart_title.text_frame.text == '[Revenue by region]'
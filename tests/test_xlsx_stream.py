@@ -0,0 +1,47 @@
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+import openpyxl
+import pytest
+
+from utils import xlsx_stream
+from utils.file_processor import parse_xlsx_stream
+
+TEXTS = ['Alpha', 'Beta', 'Gamma & Delta']
+
+def make_inline_sheet_xlsx(path):
+    wb = openpyxl.Workbook()
+    wb.active['A1'] = 'placeholder'
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    cells = ''.join(
+        f'<c r="{column}1" t="inlineStr"><is><t>{escape(text)}</t></is></c>'
+        for column, text in zip('ABC', TEXTS)
+    )
+    sheet = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<worksheet xmlns="{xlsx_stream.SPREADSHEET_NS}"><sheetData><row r="1">{cells}</row></sheetData></worksheet>'
+    )
+    with zipfile.ZipFile(buffer) as source, zipfile.ZipFile(path, 'w') as output:
+        for info in source.infolist():
+            data = sheet.encode('utf-8') if info.filename == 'xl/worksheets/sheet1.xml' else source.read(info)
+            output.writestr(info, data)
+
+# 逐块读取时切分点可能落在最后一个完整的<is>元素内部，该元素也要被收集和改写
+# 块大小覆盖切分点在工作表XML中的每个位置
+@pytest.mark.parametrize('chunk_size', list(range(1, 200)) + [1 << 20])
+def test_inline_strings_round_trip(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(xlsx_stream, 'CHUNK_SIZE', chunk_size)
+    path = str(tmp_path / 'inline.xlsx')
+    output_path = str(tmp_path / 'translated.xlsx')
+    make_inline_sheet_xlsx(path)
+    
+    document = parse_xlsx_stream(path)
+    assert [text for text, _ in document.segments] == TEXTS
+    for text, write_back in document.segments:
+        write_back(f'[{text}]')
+    document.content.save(output_path)
+    
+    sheet = openpyxl.load_workbook(output_path).active
+    assert [cell.value for cell in sheet[1]] == [f'[{text}]' for text in TEXTS]
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import tempfile
+
+import app
+from utils.glossary import load_glossary
+from utils.job_manager import Job
+
+# 批量翻译命令行：翻译目录或zip压缩包中的所有文档，与/batch接口使用相同的流水线和配置（环境变量或.env文件）
+#
+#     python translate_batch.py ./docs -o ./translated --source en --target zh,ja
+#
+# 译文按目标语言分目录保存在输出目录中，批量报告写入输出目录下的batch_report.json
+
+def main():
+    parser = argparse.ArgumentParser(description='批量翻译目录或zip压缩包中的文档')
+    parser.add_argument('input', help='文档目录或zip压缩包')
+    parser.add_argument('-o', '--output', required=True, help='输出目录')
+    parser.add_argument('--source', required=True, help='源语言代码，例如en')
+    parser.add_argument('--target', required=True, help='逗号分隔的目标语言代码，例如zh,ja')
+    parser.add_argument('--api-key', default=app.DEFAULT_OPENAI_API_KEY, help='API密钥（默认读取OPENAI_API_KEY）')
+    parser.add_argument('--api-base', default=app.DEFAULT_OPENAI_API_BASE, help='API基础URL（默认读取OPENAI_API_BASE）')
+    parser.add_argument('--model', default=app.DEFAULT_OPENAI_MODEL, help='模型名称（默认读取OPENAI_MODEL）')
+    parser.add_argument('--refine-policy', default=app.DEFAULT_REFINE_POLICY, choices=app.REFINE_POLICIES, help='第二步纠错策略')
+    parser.add_argument('--refine-min-chars', type=int, default=app.DEFAULT_REFINE_MIN_CHARS, help='length策略的字符数阈值')
+    parser.add_argument('--mode', default=app.DEFAULT_TRANSLATION_MODE, choices=app.TRANSLATION_MODES, help='翻译模式')
+    parser.add_argument('--glossary', help='术语表文件（CSV/TSV/TXT/XLSX），用于上下文翻译模式')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        parser.error(f'输入不存在: {args.input}')
+
+    def lang_name(code):
+        return next((lang['name'] for lang in app.SUPPORTED_LANGUAGES if lang['code'] == code), code)
+
+    target_langs = [[code, lang_name(code)] for code in dict.fromkeys(code.strip() for code in args.target.split(',') if code.strip())]
+    if not target_langs:
+        parser.error('未指定目标语言')
+
+    glossary = None
+    if args.glossary:
+        languages = {}
+        for lang in app.SUPPORTED_LANGUAGES:
+            languages[lang['code']] = lang['name']
+            languages[lang['name']] = lang['name']
+        try:
+            with open(args.glossary, 'rb') as f:
+                glossary = load_glossary(f, args.glossary, languages, app.GLOSSARY_MAX_TERMS)
+        except (OSError, ValueError) as e:
+            parser.error(f'无法读取术语表: {e}')
+
+    with tempfile.TemporaryDirectory(prefix='translate4original_batch_') as work_dir:
+        job = Job(owner='cli', work_dir=work_dir)
+
+        def print_item(item):
+            status = item['status'] if not item['error'] else f"{item['status']}: {item['error']}"
+            print(f"[{job.done}/{job.total}] {item['file']}  {item['seconds']}s  {status}", flush=True)
+
+        result = app.run_batch_job(
+            job, args.input, lang_name(args.source), target_langs, None, None,
+            args.api_key, args.api_base, args.model, args.refine_policy, args.refine_min_chars,
+            output_dir=args.output, file_callback=print_item, translation_mode=args.mode, glossary=glossary
+        )
+
+    report = result['report']
+    print(f"共{report['total']}个文件，完成{report['completed']}个，失败{report['failed']}个，耗时{report['seconds']}s")
+    return 1 if report['failed'] or report['skipped'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 需要重试的HTTP状态码：限流和网关临时错误
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# 令牌桶限流器：rate为每秒补充的令牌数，capacity为允许的突发请求数
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # 获取一个令牌，令牌不足时阻塞等待
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+# 解析Retry-After响应头（秒数或HTTP日期），无法解析时返回None
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# 逐条读取SSE响应中的data字段，遇到[DONE]时结束
+def iter_sse_data(response):
+    response.encoding = 'utf-8'
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith('data:'):
+            continue
+        data = line[5:].strip()
+        if data == '[DONE]':
+            return
+        yield data
+
+# 共享的HTTP客户端：按服务地址复用连接池，带超时、重试和客户端限流
+class ApiClient:
+    def __init__(self, connect_timeout=5, read_timeout=120, max_retries=4, backoff_base=1.0, backoff_max=30.0,
+                 rate_limit=0, rate_burst=None, pool_size=16):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.pool_size = pool_size
+        self._sessions = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    # 获取服务地址对应的会话（复用TCP/TLS连接）
+    def session_for(self, url):
+        origin = self._origin(url)
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[origin] = session
+            return session
+
+    # 发送POST请求：连接错误、429和5xx按带抖动的指数退避重试，优先使用Retry-After
+    # 返回的响应对象带有retries属性，记录本次请求的重试次数
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.session_for(url)
+        bucket = self._bucket_for(url)
+        attempt = 0
+        while True:
+            if bucket:
+                bucket.acquire()
+            try:
+                response = session.post(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                response.retries = attempt
+                return response
+
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = self._backoff(attempt)
+            response.close()
+            time.sleep(min(delay, self.backoff_max))
+            attempt += 1
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    # 带完全抖动的指数退避时间
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _bucket_for(self, url):
+        if not self.rate_limit:
+            return None
+        origin = self._origin(url)
+        with self._lock:
+            bucket = self._buckets.get(origin)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_limit, self.rate_burst)
+                self._buckets[origin] = bucket
+            return bucket
+
+    @staticmethod
+    def _origin(url):
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
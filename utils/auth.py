@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from utils.metrics import REGISTRY
+
+# 账号验证服务相关的工具：验证结果缓存和后台发送的审计事件队列
+# 验证服务变慢或不可用时，已登录过的账号和翻译请求都不会在请求线程中等待验证服务
+
+REGISTRY.describe('translate_auth_events_total', '账号验证和审计事件计数（缓存命中、发送、丢弃、失败）')
+
+# 账号验证结果缓存：验证通过的账号密码在ttl秒内再次登录时不再请求验证服务
+# 缓存键为账号和密码的HMAC摘要（密钥为进程内随机生成），内存中不保存明文密码；验证失败的结果不缓存
+class CredentialCache:
+    def __init__(self, ttl=300, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, userid, password):
+        return hmac.new(self._secret, f'{userid}\0{password}'.encode('utf-8'), hashlib.sha256).digest()
+
+    # 账号密码是否在有效期内验证通过过
+    def get(self, userid, password):
+        key = self._digest(userid, password)
+        with self._lock:
+            expires = self._entries.get(key)
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                expires = None
+        REGISTRY.inc('translate_auth_events_total', event='cache_hits' if expires is not None else 'cache_misses')
+        return expires is not None
+
+    def put(self, userid, password):
+        key = self._digest(userid, password)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# 审计事件队列：请求线程只把事件放入队列，后台线程按批取出后调用send_func(事件列表)发送
+# 每批最多batch_size个事件，第一个事件到达后最多等待flush_interval秒凑满一批；
+# 队列中的事件超过max_queue时丢弃新事件并计数，发送失败的事件只计数不重试，不影响翻译
+class AuditQueue:
+    def __init__(self, send_func, batch_size=50, flush_interval=0.5, max_queue=10000):
+        self.send_func = send_func
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # 后台线程在第一次提交事件时启动，多进程部署时每个工作进程各自启动
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-sender', daemon=True)
+                self._thread.start()
+
+    # 提交一个事件，返回是否成功放入队列
+    def submit(self, event):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            REGISTRY.inc('translate_auth_events_total', event='audit_dropped')
+            return False
+        return True
+
+    # 等待此前提交的事件发送完成，最多等待timeout秒，返回是否全部发送完成
+    def flush(self, timeout=None):
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    # 队列中等待发送的事件数
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            batch = []
+            markers = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    # flush标记：把已取出的事件立即发送
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._send(batch)
+            for marker in markers:
+                marker.set()
+
+    def _send(self, batch):
+        try:
+            self.send_func(batch)
+        except Exception as e:
+            REGISTRY.inc('translate_auth_events_total', len(batch), event='audit_failed')
+            print(f"发送审计事件失败: {str(e)}")
+            return
+        REGISTRY.inc('translate_auth_events_total', len(batch), event='audit_sent')
@@ -0,0 +1,259 @@
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from utils.file_processor import DEFAULT_MAX_WORKERS, DEFAULT_XLSX_STREAM_THRESHOLD, parse_document, run_segments_targets, save_translated_file
+from utils.job_manager import JobCancelled
+
+# 批量翻译：一个zip压缩包或目录中的多个文档按流水线处理
+# 解析、翻译、保存三个阶段互相重叠：前面的文档等待翻译时，后面的文档已经在解析；
+# 所有文档的翻译请求提交到同一个线程池，相同原文在整个批次中只翻译一次
+
+# 批量报告文件名
+BATCH_REPORT_NAME = 'batch_report.json'
+
+# 文件状态
+FILE_COMPLETED = 'completed'
+FILE_FAILED = 'failed'
+FILE_SKIPPED = 'skipped'
+
+# zip压缩包中的路径转换为相对路径：去掉空目录名、'.'、'..'和控制字符，保留中文等非ASCII字符
+# 转换后的路径只用于批量报告和输出文件，解压的文件使用生成的文件名保存
+def _safe_relative_path(name):
+    parts = [''.join(char for char in part if char.isprintable()).strip() for part in name.replace('\\', '/').split('/')]
+    parts = [part for part in parts if part.strip('.')]
+    return '/'.join(parts) if parts else None
+
+# 收集批量翻译的输入文件，返回[(相对路径, 文件路径, 错误信息)]，按相对路径排序
+# source为目录时直接读取目录中的文件；为zip压缩包时解压到extract_dir，文件按序号和原扩展名保存（例如0001.docx）
+# 文件名无效或与前面的文件重名的条目不解压，文件路径为None并给出错误信息，在批量报告中记为跳过
+# 不支持的文件类型被忽略；解压后的总大小超过max_extract_bytes或文件数超过max_files时抛出ValueError
+def collect_batch_files(source, extract_dir, allowed_extensions, max_files=None, max_extract_bytes=None):
+    def allowed(name):
+        return '.' in name and name.rsplit('.', 1)[1].lower() in allowed_extensions
+
+    files = []
+    if os.path.isdir(source):
+        for root, dirs, names in os.walk(source):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                if allowed(name) and not name.startswith('~$'):
+                    files.append((os.path.relpath(path, source).replace(os.sep, '/'), path, None))
+    else:
+        with zipfile.ZipFile(source) as archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir() and allowed(info.filename) and not os.path.basename(info.filename).startswith('~$')
+            ]
+            if max_files is not None and len(members) > max_files:
+                raise ValueError(f'压缩包中的文件数超过{max_files}个的限制')
+            if max_extract_bytes is not None and sum(info.file_size for info in members) > max_extract_bytes:
+                raise ValueError(f'压缩包解压后的大小超过{max_extract_bytes // (1024 * 1024)}MB的限制')
+
+            os.makedirs(extract_dir, exist_ok=True)
+            used = set()
+            for index, info in enumerate(members, 1):
+                relative_path = _safe_relative_path(info.filename)
+                if not relative_path:
+                    files.append((info.filename, None, '文件名无效'))
+                    continue
+                if relative_path in used:
+                    files.append((relative_path, None, '压缩包中存在同名文件，已跳过'))
+                    continue
+                used.add(relative_path)
+                path = os.path.join(extract_dir, f"{index:04d}.{info.filename.rsplit('.', 1)[1].lower()}")
+                with archive.open(info) as src, open(path, 'wb') as dst:
+                    while True:
+                        chunk = src.read(1 << 20)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                files.append((relative_path, path, None))
+
+    files.sort(key=lambda file: file[0])
+    if max_files is not None and len(files) > max_files:
+        raise ValueError(f'文件数超过{max_files}个的限制')
+    return files
+
+# 批次内共享的译文：相同原文在整个批次中只翻译一次
+# 已完成的译文直接复用；正在翻译中的原文由后来的请求等待同一个结果，不重复调用API
+class SharedTranslations:
+    def __init__(self, translate_func, batch_translate_func=None):
+        self.translate_func = translate_func
+        self.batch_translate_func = batch_translate_func
+        self.hits = 0
+        self._results = {}
+        self._lock = threading.Lock()
+
+    # 登记原文，返回(Future, 是否由调用方负责翻译)
+    def _claim(self, key):
+        with self._lock:
+            future = self._results.get(key)
+            if future is not None:
+                self.hits += 1
+                return future, False
+            future = Future()
+            self._results[key] = future
+            return future, True
+
+    # 翻译失败时移除登记，之后的请求重新翻译
+    def _release(self, key, future, error):
+        with self._lock:
+            if self._results.get(key) is future:
+                del self._results[key]
+        future.set_exception(error)
+
+    # 其余参数（例如上下文模式的context）原样传给翻译函数
+    def translate(self, text, source_lang, target_lang, custom_prompt=None, **kwargs):
+        key = (text, source_lang, target_lang)
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+        try:
+            translated_text = self.translate_func(text, source_lang, target_lang, custom_prompt, **kwargs)
+        except Exception as e:
+            self._release(key, future, e)
+            raise
+        future.set_result(translated_text)
+        return translated_text
+
+    # 批量翻译：只把批次中尚未登记的原文发送给模型，其余原文等待已有的结果；其余参数原样传给翻译函数
+    def translate_batch(self, texts, source_lang, target_lang, custom_prompt=None, **kwargs):
+        claims = [self._claim((text, source_lang, target_lang)) for text in texts]
+        owned = [index for index, (_, owner) in enumerate(claims) if owner]
+        if owned:
+            owned_texts = [texts[index] for index in owned]
+            try:
+                if len(owned_texts) == 1 or self.batch_translate_func is None:
+                    results = [self.translate_func(text, source_lang, target_lang, custom_prompt, **kwargs) for text in owned_texts]
+                else:
+                    results = self.batch_translate_func(owned_texts, source_lang, target_lang, custom_prompt, **kwargs)
+            except Exception as e:
+                for index in owned:
+                    self._release((texts[index], source_lang, target_lang), claims[index][0], e)
+                raise
+            for index, translated_text in zip(owned, results):
+                claims[index][0].set_result(translated_text)
+        return [future.result() for future, _ in claims]
+
+# 累加阶段耗时的计时上下文
+@contextmanager
+def _phase_timer(timings, phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+
+# 批量翻译流水线
+# parse_workers个文档同时解析，save_workers个文档同时写回和保存，所有文档的翻译请求共用translate_workers个线程；
+# max_in_flight限制同时处于流水线中的文档数，避免解析后的文档全部驻留内存
+# target_langs为[(语言代码, 语言名称)]；输出文件保存在output_dir/语言代码/相对路径
+class BatchPipeline:
+    def __init__(self, translate_func, batch_translate_func=None, parse_workers=2, save_workers=2,
+                 translate_workers=DEFAULT_MAX_WORKERS, max_in_flight=None, xlsx_stream_threshold=DEFAULT_XLSX_STREAM_THRESHOLD,
+                 **options):
+        self.shared = SharedTranslations(translate_func, batch_translate_func)
+        self.parse_workers = parse_workers
+        self.save_workers = save_workers
+        self.translate_workers = translate_workers
+        self.max_in_flight = max_in_flight or parse_workers + save_workers + 2
+        self.xlsx_stream_threshold = xlsx_stream_threshold
+        self.options = options
+        if batch_translate_func is not None:
+            self.options['batch_translate_func'] = self.shared.translate_batch
+
+    # 执行批量翻译，返回批量报告；file_callback(报告项)在每个文件结束后调用
+    def run(self, files, output_dir, source_lang, target_langs, file_callback=None, cancel_event=None):
+        parse_slots = threading.Semaphore(self.parse_workers)
+        save_slots = threading.Semaphore(self.save_workers)
+        codes = {name: code for code, name in target_langs}
+        started = time.time()
+
+        # files为collect_batch_files的返回值；error不为None的文件直接记为跳过
+        def process(relative_path, path, error=None):
+            item = {'file': relative_path, 'status': FILE_COMPLETED, 'error': None, 'outputs': []}
+            timings = {}
+            if error is not None:
+                item.update(status=FILE_SKIPPED, error=error, timings={}, seconds=0.0)
+                if file_callback:
+                    file_callback(item)
+                return item
+            try:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise JobCancelled('任务已取消')
+
+                stats = {}
+                with parse_slots, _phase_timer(timings, 'parse'):
+                    document = parse_document(path, self.xlsx_stream_threshold, stats)
+
+                def save_target(target_name):
+                    code = codes[target_name]
+                    output_path = os.path.join(output_dir, code, *relative_path.split('/'))
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    with save_slots, _phase_timer(timings, 'save'):
+                        if document.finalize:
+                            document.finalize()
+                        save_translated_file(document.content, document.file_type, output_path)
+                    item['outputs'].append(f'{code}/{relative_path}')
+
+                if document.segments:
+                    run_segments_targets(
+                        document.segments, source_lang, [name for _, name in target_langs], self.shared.translate,
+                        ignore_errors=document.ignore_errors, stats=stats, timer=partial(_phase_timer, timings),
+                        on_target=save_target,
+                        executor=executor, cancel_event=cancel_event, **self.options
+                    )
+                else:
+                    for _, name in target_langs:
+                        save_target(name)
+                item['segments'] = stats.get('segments', 0)
+                item['unique_segments'] = stats.get('unique_segments', 0)
+                item['skipped_segments'] = stats.get('skipped_segments', 0)
+            except JobCancelled as e:
+                item['status'] = FILE_SKIPPED
+                item['error'] = str(e)
+            except Exception as e:
+                item['status'] = FILE_FAILED
+                item['error'] = str(e)
+            item['timings'] = {phase: round(seconds, 3) for phase, seconds in timings.items()}
+            item['seconds'] = round(sum(timings.values()), 3)
+            if file_callback:
+                file_callback(item)
+            return item
+
+        # 翻译阶段的耗时包含等待共享线程池的时间
+        with ThreadPoolExecutor(max_workers=self.translate_workers, thread_name_prefix='batch-translate') as executor, \
+                ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='batch-document') as documents:
+            items = list(documents.map(lambda file: process(*file), files))
+
+        report = {
+            'source_lang': source_lang,
+            'target_langs': [code for code, _ in target_langs],
+            'files': items,
+            'total': len(items),
+            'completed': sum(1 for item in items if item['status'] == FILE_COMPLETED),
+            'failed': sum(1 for item in items if item['status'] == FILE_FAILED),
+            'skipped': sum(1 for item in items if item['status'] == FILE_SKIPPED),
+            'shared_hits': self.shared.hits,
+            'seconds': round(time.time() - started, 3)
+        }
+        with open(os.path.join(output_dir, BATCH_REPORT_NAME), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+# 把输出目录打包为zip
+def zip_directory(directory, output_path):
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        for root, dirs, names in os.walk(directory):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                archive.write(path, os.path.relpath(path, directory))
+    return output_path
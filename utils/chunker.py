@@ -0,0 +1,101 @@
+import re
+
+from utils.segment_filter import resolve_language
+from utils.tokens import estimate_tokens
+
+# 超长片段切分：按段落、句子、分句的顺序寻找边界，使每块的估算token数不超过上限，
+# 仍然过长的部分按字符硬切分；切分不会落在<gN>行内标记内部，跨块的标记会在块边界闭合并在下一块重新打开
+
+# 各级切分边界：换行、句末标点（中日泰英）、分句标点和空白（泰文句子之间以空格分隔）
+_BOUNDARY_PATTERNS = [
+    re.compile(r'\n+'),
+    re.compile(r'[。！？!?；…]+[」』”’"\')）]*\s*|[.;]+[”’"\')]*\s+'),
+    re.compile(r'[，、,：:]\s*|\s+'),
+]
+_TAG_RE = re.compile(r'<(/?)g(\d+)>')
+_EMPTY_GROUP_RE = re.compile(r'<g(\d+)></g\1>')
+
+# 不需要在句子之间加空格的目标语言
+_NO_SPACE_LANGUAGES = {'zh', 'ja'}
+
+# 在边界正则匹配的位置切分文本，返回拼接后等于原文的片段列表
+def _split_at(text, pattern):
+    pieces = []
+    start = 0
+    for match in pattern.finditer(text):
+        if match.end() > start and match.end() < len(text):
+            pieces.append(text[start:match.end()])
+            start = match.end()
+    pieces.append(text[start:])
+    return pieces
+
+# 按字符硬切分，每块最多max_tokens个字符（每个字符最多约1个token），不切开行内标记
+def _hard_split(text, max_tokens):
+    tag_spans = [match.span() for match in _TAG_RE.finditer(text)]
+    pieces = []
+    start = 0
+    while len(text) - start > max_tokens:
+        end = start + max_tokens
+        for tag_start, tag_end in tag_spans:
+            if tag_start < end < tag_end:
+                end = tag_end
+                break
+        pieces.append(text[start:end])
+        start = end
+    pieces.append(text[start:])
+    return pieces
+
+# 把文本切成估算token数不超过max_tokens的片段，level为当前使用的边界级别
+def _split_text(text, max_tokens, level=0):
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    if level >= len(_BOUNDARY_PATTERNS):
+        return _hard_split(text, max_tokens)
+
+    chunks = []
+    current = ''
+    for piece in _split_at(text, _BOUNDARY_PATTERNS[level]):
+        if current and estimate_tokens(current + piece) > max_tokens:
+            chunks.append(current)
+            current = ''
+        if estimate_tokens(piece) > max_tokens:
+            chunks.extend(_split_text(piece, max_tokens, level + 1))
+        else:
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+# 切分超长文本，返回[(块文本, 块后的分隔空白)]；文本不超过max_tokens时只有一块
+def chunk_text(text, max_tokens):
+    if not max_tokens or estimate_tokens(text) <= max_tokens:
+        return [(text, '')]
+
+    chunks = []
+    open_id = None
+    for raw in _split_text(text, max_tokens):
+        body = raw.rstrip()
+        separator = raw[len(body):]
+        # 上一块中未闭合的标记在本块开头重新打开
+        prefix = f'<g{open_id}>' if open_id else ''
+        for match in _TAG_RE.finditer(body):
+            open_id = None if match.group(1) else match.group(2)
+        suffix = f'</g{open_id}>' if open_id else ''
+        body = _EMPTY_GROUP_RE.sub('', prefix + body + suffix)
+        if body.strip():
+            chunks.append((body, separator))
+        elif chunks:
+            chunks[-1] = (chunks[-1][0], chunks[-1][1] + separator)
+    return chunks or [(text, '')]
+
+# 拼接各块译文：保留原文中的换行，其他分隔空白按目标语言决定是否保留一个空格
+def join_chunks(translated_chunks, separators, target_lang):
+    no_space = resolve_language(target_lang) in _NO_SPACE_LANGUAGES
+    parts = []
+    for translated_text, separator in zip(translated_chunks, separators):
+        parts.append(translated_text.strip())
+        if '\n' in separator:
+            parts.append('\n' * separator.count('\n'))
+        elif separator and not no_space:
+            parts.append(' ')
+    return ''.join(parts).rstrip(' ')
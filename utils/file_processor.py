@@ -1,149 +1,501 @@
 import os
 import docx
+from docx.opc.constants import CONTENT_TYPE as CT
+from docx.opc.part import XmlPart
 import openpyxl
 import pptx
 from pptx.util import Inches
 import tempfile
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 
-# 处理DOCX文件
-def process_docx(file_path, source_lang, target_lang, translate_func, custom_prompt=None):
+from lxml import etree
+
+from utils.job_manager import JobCancelled
+from utils.run_markup import DRAWING, DRAWING_NS, WORD, WORD_NS, paragraph_segment
+from utils.segment_filter import classify_segment
+from utils.tokens import estimate_tokens
+from utils.xlsx_stream import StreamedWorkbook
+
+# 默认并发翻译线程数
+DEFAULT_MAX_WORKERS = 8
+
+# 批量翻译默认参数：不超过单片段token上限的短片段才会被打包
+DEFAULT_BATCH_TOKEN_BUDGET = 1500
+DEFAULT_BATCH_MAX_SEGMENTS = 40
+DEFAULT_BATCH_SEGMENT_MAX_TOKENS = 64
+
+# 把短片段按token预算打包成批次，返回(批次索引列表, 单独翻译的索引列表)
+def plan_batches(texts, token_budget=DEFAULT_BATCH_TOKEN_BUDGET, max_segments=DEFAULT_BATCH_MAX_SEGMENTS, segment_max_tokens=DEFAULT_BATCH_SEGMENT_MAX_TOKENS):
+    batches = []
+    singles = []
+    current = []
+    current_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if tokens > segment_max_tokens:
+            singles.append(index)
+            continue
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_segments):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    
+    # 只有一个片段的批次直接逐条翻译
+    singles.extend(batch[0] for batch in batches if len(batch) == 1)
+    batches = [batch for batch in batches if len(batch) > 1]
+    return batches, sorted(singles)
+
+# 并发翻译片段列表，按原顺序返回译文
+# 提供batch_translate_func时，短片段会被打包成一次请求翻译
+# ignore_errors为True时，翻译失败的片段返回None（保留原文）
+# progress_callback(已完成片段数, 总片段数)在每个请求完成后调用
+# cancel_event被设置后，不再发送新的请求并抛出JobCancelled
+# executor为共享的线程池时请求提交到该线程池，max_workers不再生效
+def translate_segments(texts, source_lang, target_lang, translate_func, custom_prompt=None, max_workers=None, ignore_errors=False,
+                       batch_translate_func=None, batch_token_budget=DEFAULT_BATCH_TOKEN_BUDGET,
+                       batch_max_segments=DEFAULT_BATCH_MAX_SEGMENTS, batch_segment_max_tokens=DEFAULT_BATCH_SEGMENT_MAX_TOKENS,
+                       progress_callback=None, cancel_event=None, executor=None):
+    results = [None] * len(texts)
+    if progress_callback:
+        progress_callback(0, len(texts))
+    if not texts:
+        return results
+    
+    if batch_translate_func:
+        batches, singles = plan_batches(texts, batch_token_budget, batch_max_segments, batch_segment_max_tokens)
+    else:
+        batches, singles = [], list(range(len(texts)))
+    
+    workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, len(batches) + len(singles)))
+    with nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for batch in batches:
+            future = pool.submit(batch_translate_func, [texts[index] for index in batch], source_lang, target_lang, custom_prompt)
+            futures[future] = batch
+        for index in singles:
+            future = pool.submit(translate_func, texts[index], source_lang, target_lang, custom_prompt)
+            futures[future] = index
+        
+        done = 0
+        for future in as_completed(futures):
+            target = futures[future]
+            done += len(target) if isinstance(target, list) else 1
+            if progress_callback:
+                progress_callback(done, len(texts))
+            try:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise JobCancelled('任务已取消')
+                result = future.result()
+            except Exception as e:
+                if ignore_errors and not isinstance(e, JobCancelled):
+                    continue
+                # 出错或取消时取消尚未开始的片段，避免继续消耗API调用
+                for pending in futures:
+                    pending.cancel()
+                raise
+            if isinstance(target, list):
+                for index, translated_text in zip(target, result):
+                    results[index] = translated_text
+            else:
+                results[target] = result
+    
+    return results
+
+# 包装翻译函数：每个片段完成后立即写入检查点
+def _checkpointed(translate_func, checkpoint, target_lang):
+    def wrapper(text, *args):
+        translated_text = translate_func(text, *args)
+        checkpoint.put(text, translated_text, target_lang)
+        return translated_text
+    return wrapper
+
+def _checkpointed_batch(batch_translate_func, checkpoint, target_lang):
+    def wrapper(texts, *args):
+        translated_texts = batch_translate_func(texts, *args)
+        checkpoint.put_many(zip(texts, translated_texts), target_lang)
+        return translated_texts
+    return wrapper
+
+# 每个原文在文档中前后相邻的原文（按首次出现的顺序），返回{原文: (上文列表, 下文列表)}
+# window为(上文片段数, 下文片段数)
+def segment_contexts(unique_texts, window):
+    before, after = window
+    return {
+        text: (unique_texts[max(0, index - before):index], unique_texts[index + 1:index + 1 + after])
+        for index, text in enumerate(unique_texts)
+    }
+
+# 包装翻译函数：调用时通过context参数传入片段的上下文
+def _with_context(translate_func, contexts):
+    def wrapper(text, *args):
+        return translate_func(text, *args, context=contexts.get(text))
+    return wrapper
+
+# 包装批量翻译函数：一批相邻的短片段以第一个片段的上文和最后一个片段的下文（不含批次中的片段）作为上下文
+def _with_batch_context(batch_translate_func, contexts):
+    def wrapper(texts, *args):
+        members = set(texts)
+        before = [text for text in contexts.get(texts[0], ((), ()))[0] if text not in members]
+        after = [text for text in contexts.get(texts[-1], ((), ()))[1] if text not in members]
+        return batch_translate_func(texts, *args, context=(before, after))
+    return wrapper
+
+# 按目标语言过滤数字、编号、网址等无需翻译的原文，返回(需要翻译的原文列表, 跳过的原文集合)
+def _filter_texts(unique_texts, source_lang, target_lang, skip_untranslatable):
+    if not skip_untranslatable:
+        return unique_texts, set()
+    skipped_texts = {
+        text for text in unique_texts
+        if not classify_segment(text, source_lang, target_lang)[0]
+    }
+    return [text for text in unique_texts if text not in skipped_texts], skipped_texts
+
+# 翻译去重后的原文，返回({原文: 译文}, 从检查点恢复的片段数)
+# checkpoint为JobCheckpoint时记录目标语言的片段清单和每个完成的译文，已完成的片段直接使用检查点中的译文
+# contexts为segment_contexts的结果时，逐条翻译的片段和每批短片段通过context参数获得相邻片段
+def translate_texts(texts, source_lang, target_lang, translate_func, custom_prompt=None, ignore_errors=False, checkpoint=None,
+                    contexts=None, **options):
+    if contexts is not None:
+        translate_func = _with_context(translate_func, contexts)
+        if options.get('batch_translate_func'):
+            options['batch_translate_func'] = _with_batch_context(options['batch_translate_func'], contexts)
+    translations = {}
+    pending_texts = texts
+    if checkpoint is not None:
+        checkpoint.set_manifest(texts, target_lang)
+        completed = checkpoint.completed(target_lang)
+        translations = {text: completed[text] for text in texts if text in completed}
+        pending_texts = [text for text in texts if text not in translations]
+        translate_func = _checkpointed(translate_func, checkpoint, target_lang)
+        if options.get('batch_translate_func'):
+            options['batch_translate_func'] = _checkpointed_batch(options['batch_translate_func'], checkpoint, target_lang)
+        # 进度包含检查点中已完成的片段
+        progress_callback = options.get('progress_callback')
+        if progress_callback:
+            resumed = len(translations)
+            options['progress_callback'] = lambda done, total: progress_callback(done + resumed, total + resumed)
+    
+    results = translate_segments(
+        pending_texts,
+        source_lang,
+        target_lang,
+        translate_func,
+        custom_prompt,
+        ignore_errors=ignore_errors,
+        **options
+    )
+    resumed = len(translations)
+    translations.update(zip(pending_texts, results))
+    return translations, resumed
+
+# 把译文写回所有片段，相同原文写回所有位置
+# restore为True时没有译文的片段写回原文：同一份文档依次写入多种目标语言时，清除上一种语言留下的译文
+def write_segments(segments, translations, restore=False):
+    for text, write_back in segments:
+        translated_text = translations.get(text)
+        if translated_text is None and restore:
+            translated_text = text
+        if translated_text is not None:
+            write_back(translated_text)
+
+# 写入片段数量、去重比例、检查点恢复和跳过的片段统计；skipped为{目标语言: 跳过的原文集合}
+# 跳过的片段数按文档只记一次（所有目标语言都跳过的片段），多目标语言时各目标语言跳过的片段数记在skipped_segments_by_target中，节省的token按目标语言累加
+def _record_segment_stats(stats, segments, unique_count, resumed=None, skipped=None):
+    stats['segments'] = stats.get('segments', 0) + len(segments)
+    stats['unique_segments'] = stats.get('unique_segments', 0) + unique_count
+    stats['dedup_ratio'] = round(1 - stats['unique_segments'] / stats['segments'], 4) if stats['segments'] else 0.0
+    if resumed is not None:
+        stats['resumed_segments'] = stats.get('resumed_segments', 0) + resumed
+    if not skipped:
+        return
+    
+    def count(texts):
+        return sum(1 for text, _ in segments if text in texts)
+    
+    common = set.intersection(*skipped.values())
+    stats['skipped_segments'] = stats.get('skipped_segments', 0) + count(common)
+    stats['skipped_unique_segments'] = stats.get('skipped_unique_segments', 0) + len(common)
+    # 每个片段两步翻译各有一次输入和输出，按原文token数的4倍估算节省量
+    stats['skipped_tokens'] = stats.get('skipped_tokens', 0) + sum(
+        estimate_tokens(text) * 4 for skipped_texts in skipped.values() for text in skipped_texts
+    )
+    if len(skipped) > 1:
+        by_target = stats.setdefault('skipped_segments_by_target', {})
+        for target_lang, skipped_texts in skipped.items():
+            by_target[target_lang] = by_target.get(target_lang, 0) + count(skipped_texts)
+
+# 两阶段处理：先收集全部片段，再并发翻译，最后按文档顺序写回
+# segments为(原文, 写回函数)列表，相同原文只翻译一次后写回所有位置
+# skip_untranslatable为True时，数字、编号、网址等片段原样保留，不发送给模型
+# stats为字典时写入片段数量、去重比例和跳过的片段统计
+# checkpoint为JobCheckpoint时记录片段清单和每个完成的译文，已完成的片段直接使用检查点中的译文
+# timer(阶段名)返回计时上下文，用于统计翻译（translate）和写回（write_back）阶段的耗时
+# context_window为(上文片段数, 下文片段数)时，translate_func和batch_translate_func通过context参数获得相邻片段的原文
+def run_segments(segments, source_lang, target_lang, translate_func, custom_prompt=None, ignore_errors=False, stats=None,
+                 skip_untranslatable=False, checkpoint=None, timer=None, context_window=None, **options):
+    unique_texts = list(dict.fromkeys(text for text, _ in segments))
+    texts, skipped_texts = _filter_texts(unique_texts, source_lang, target_lang, skip_untranslatable)
+    contexts = segment_contexts(unique_texts, context_window) if context_window else None
+    
+    with timer('translate') if timer else nullcontext():
+        translations, resumed = translate_texts(
+            texts, source_lang, target_lang, translate_func, custom_prompt, ignore_errors, checkpoint, contexts, **options
+        )
+    with timer('write_back') if timer else nullcontext():
+        write_segments(segments, translations)
+    
+    if stats is not None:
+        _record_segment_stats(
+            stats, segments, len(unique_texts),
+            resumed if checkpoint is not None else None,
+            {target_lang: skipped_texts} if skip_untranslatable else None
+        )
+
+# 把同一组片段翻译为多种目标语言：片段收集和去重只做一次，各目标语言并发翻译，
+# 所有请求提交到同一个线程池，总并发数仍为max_workers；任一目标语言失败时其余目标语言不再发送新的请求
+# executor为共享的线程池时（例如批量翻译多个文档）请求提交到该线程池
+# 翻译全部完成后，依次把每种目标语言的译文写回片段并调用on_target(目标语言)，由调用方保存该语言的文件
+# 进度按所有目标语言的片段合计，其余参数与run_segments相同
+def run_segments_targets(segments, source_lang, target_langs, translate_func, custom_prompt=None, ignore_errors=False, stats=None,
+                         skip_untranslatable=False, checkpoint=None, timer=None, on_target=None, max_workers=None,
+                         progress_callback=None, executor=None, context_window=None, **options):
+    unique_texts = list(dict.fromkeys(text for text, _ in segments))
+    contexts = segment_contexts(unique_texts, context_window) if context_window else None
+    filtered = {
+        target_lang: _filter_texts(unique_texts, source_lang, target_lang, skip_untranslatable)
+        for target_lang in target_langs
+    }
+    
+    progress = {target_lang: (0, len(filtered[target_lang][0])) for target_lang in target_langs}
+    progress_lock = threading.Lock()
+    
+    def target_progress(target_lang):
+        def callback(done, total):
+            with progress_lock:
+                progress[target_lang] = (done, total)
+                done_total = sum(value[0] for value in progress.values())
+                segment_total = sum(value[1] for value in progress.values())
+            progress_callback(done_total, segment_total)
+        return callback if progress_callback else None
+    
+    failed = threading.Event()
+    
+    def guarded(func):
+        if func is None:
+            return None
+        def wrapper(*args, **kwargs):
+            if failed.is_set():
+                raise JobCancelled('其他目标语言翻译失败')
+            return func(*args, **kwargs)
+        return wrapper
+    
+    options['batch_translate_func'] = guarded(options.get('batch_translate_func'))
+    results = {}
+    with timer('translate') if timer else nullcontext():
+        with nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=max_workers or DEFAULT_MAX_WORKERS) as pool, \
+                ThreadPoolExecutor(max_workers=len(target_langs)) as target_executor:
+            futures = {
+                target_executor.submit(
+                    translate_texts, filtered[target_lang][0], source_lang, target_lang, guarded(translate_func), custom_prompt,
+                    ignore_errors, checkpoint, contexts, executor=pool, progress_callback=target_progress(target_lang), **options
+                ): target_lang
+                for target_lang in target_langs
+            }
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except BaseException:
+                failed.set()
+                raise
+    
+    for index, target_lang in enumerate(target_langs):
+        with timer('write_back') if timer else nullcontext():
+            write_segments(segments, results[target_lang][0], restore=index > 0)
+        if on_target:
+            on_target(target_lang)
+    
+    if stats is not None:
+        _record_segment_stats(
+            stats, segments, len(unique_texts),
+            sum(resumed for _, resumed in results.values()) if checkpoint is not None else None,
+            {target_lang: filtered[target_lang][1] for target_lang in target_langs} if skip_untranslatable else None
+        )
+
+# 包含可翻译文本的DOCX部件：正文、页眉、页脚、脚注和尾注
+DOCX_STORY_CONTENT_TYPES = {
+    CT.WML_DOCUMENT_MAIN,
+    'application/vnd.ms-word.document.macroEnabled.main+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml',
+    'application/vnd.ms-word.template.macroEnabledTemplate.main+xml',
+    CT.WML_HEADER,
+    CT.WML_FOOTER,
+    CT.WML_FOOTNOTES,
+    CT.WML_ENDNOTES
+}
+
+_WORD_PARAGRAPH = f'{{{WORD_NS}}}p'
+
+# 返回DOCX中所有文本部件的(部件, XML根节点)列表
+# python-docx没有为脚注、尾注注册XML部件类型，这类部件需要自行解析内容
+def _docx_story_parts(doc):
+    parts = []
+    for part in doc.part.package.iter_parts():
+        if part.content_type not in DOCX_STORY_CONTENT_TYPES:
+            continue
+        if isinstance(part, XmlPart):
+            parts.append((part, part.element))
+        else:
+            parts.append((part, etree.fromstring(part.blob)))
+    return parts
+
+# 解析后的文档：文档对象、文件类型、待翻译片段，以及译文写回后、保存前需要执行的finalize函数
+# 片段的写回函数可以重复调用，同一份文档可以依次写入多种目标语言的译文
+class ParsedDocument:
+    def __init__(self, content, file_type, segments=None, ignore_errors=False, finalize=None):
+        self.content = content
+        self.file_type = file_type
+        self.segments = segments if segments is not None else []
+        self.ignore_errors = ignore_errors
+        self.finalize = finalize
+
+# 解析DOCX文件：一次遍历所有文本部件中的段落元素
+# 嵌套表格、文本框中的段落同样是w:p元素；横向合并的单元格在XML中只有一个w:tc，因此每个段落只收集一次
+def parse_docx(file_path):
     # 打开文档
     doc = docx.Document(file_path)
+    story_parts = _docx_story_parts(doc)
+    segments = []
     
-    # 遍历所有段落
-    for paragraph in doc.paragraphs:
-        if paragraph.text.strip():
-            # 翻译段落文本
-            translated_text = translate_func(paragraph.text, source_lang, target_lang, custom_prompt)
-            # 保留原格式，只替换文本
-            original_runs = paragraph.runs
-            if original_runs:
-                # 清空段落
-                paragraph.clear()
-                # 添加翻译后的文本，保留第一个run的所有格式
-                translated_run = paragraph.add_run(translated_text)
-                translated_run.font.name = original_runs[0].font.name
-                translated_run.font.size = original_runs[0].font.size
-                translated_run.font.bold = original_runs[0].font.bold
-                translated_run.font.italic = original_runs[0].font.italic
-                translated_run.font.underline = original_runs[0].font.underline
-                translated_run.font.color.rgb = original_runs[0].font.color.rgb if hasattr(original_runs[0].font.color, 'rgb') else None
-                # 保留段落的行距和对齐方式
-                paragraph.paragraph_format.line_spacing = paragraph.paragraph_format.line_spacing
-                paragraph.paragraph_format.alignment = paragraph.paragraph_format.alignment
-    
-    # 遍历所有表格
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                if cell.text.strip():
-                    # 翻译表格单元格文本
-                    translated_text = translate_func(cell.text, source_lang, target_lang, custom_prompt)
-                    # 保存单元格的格式
-                    original_font = None
-                    original_size = None
-                    if cell.paragraphs and cell.paragraphs[0].runs:
-                        original_font = cell.paragraphs[0].runs[0].font.name
-                        original_size = cell.paragraphs[0].runs[0].font.size
-                    # 设置翻译后的文本
-                    cell.text = translated_text
-                    # 恢复单元格的格式
-                    if cell.paragraphs and cell.paragraphs[0].runs:
-                        cell.paragraphs[0].runs[0].font.name = original_font
-                        cell.paragraphs[0].runs[0].font.size = original_size
-    
-    return doc, 'docx'
+    for part, root in story_parts:
+        for paragraph in root.iter(_WORD_PARAGRAPH):
+            # 译文按行内标记写回原有run，保留每个run的格式
+            segment = paragraph_segment(paragraph, WORD)
+            if segment:
+                segments.append(segment)
+    
+    # 自行解析的部件需要把修改后的XML写回部件内容
+    def finalize():
+        for part, root in story_parts:
+            if not isinstance(part, XmlPart):
+                part._blob = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+    
+    return ParsedDocument(doc, 'docx', segments, finalize=finalize)
 
-# 处理XLSX文件
-def process_xlsx(file_path, source_lang, target_lang, translate_func, custom_prompt=None):
+# 处理DOCX文件
+def process_docx(file_path, source_lang, target_lang, translate_func, custom_prompt=None, **options):
+    return translate_document(parse_docx(file_path), source_lang, target_lang, translate_func, custom_prompt, **options)
+
+# 默认启用流式处理的XLSX文件大小（字节）
+DEFAULT_XLSX_STREAM_THRESHOLD = 5 * 1024 * 1024
+
+# 解析XLSX文件，翻译失败时保留原文本
+# 文件不小于xlsx_stream_threshold时使用流式模式，只改写字符串部件
+def parse_xlsx(file_path, xlsx_stream_threshold=DEFAULT_XLSX_STREAM_THRESHOLD):
+    if xlsx_stream_threshold is not None and os.path.getsize(file_path) >= xlsx_stream_threshold:
+        return parse_xlsx_stream(file_path)
+    
     # 打开工作簿
     wb = openpyxl.load_workbook(file_path)
+    segments = []
     
     # 遍历所有工作表
     for sheet in wb.worksheets:
-        # 遍历所有单元格
+        # 收集所有文本单元格
         for row in sheet.iter_rows():
             for cell in row:
                 if cell.value and isinstance(cell.value, str) and cell.value.strip():
-                    # 翻译单元格文本
-                    try:
-                        translated_text = translate_func(cell.value, source_lang, target_lang, custom_prompt)
-                        cell.value = translated_text
-                    except:
-                        # 翻译失败时保留原文本
-                        pass
+                    segments.append((cell.value, partial(setattr, cell, 'value')))
     
-    return wb, 'xlsx'
+    return ParsedDocument(wb, 'xlsx', segments, ignore_errors=True)
 
-# 处理PPTX文件
-def process_pptx(file_path, source_lang, target_lang, translate_func, custom_prompt=None):
+# 流式解析大型XLSX文件：不加载单元格对象，保存时再改写压缩包
+def parse_xlsx_stream(file_path):
+    wb = StreamedWorkbook(file_path)
+    return ParsedDocument(wb, 'xlsx', wb.collect_segments(), ignore_errors=True)
+
+# 处理XLSX文件
+def process_xlsx(file_path, source_lang, target_lang, translate_func, custom_prompt=None, xlsx_stream_threshold=DEFAULT_XLSX_STREAM_THRESHOLD, **options):
+    return translate_document(parse_xlsx(file_path, xlsx_stream_threshold), source_lang, target_lang, translate_func, custom_prompt, **options)
+
+# 流式处理大型XLSX文件
+def process_xlsx_stream(file_path, source_lang, target_lang, translate_func, custom_prompt=None, **options):
+    return translate_document(parse_xlsx_stream(file_path), source_lang, target_lang, translate_func, custom_prompt, **options)
+
+_DRAWING_PARAGRAPH = f'{{{DRAWING_NS}}}p'
+_CHART_REFERENCE = '{http://schemas.openxmlformats.org/drawingml/2006/chart}chart'
+_RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# 收集PPTX部件中所有段落的片段，返回收集到的片段数；同一部件只收集一次
+# 组合形状、表格、备注和图表标题中的文本都是a:p元素，一次遍历即可覆盖
+def _collect_pptx_part(part, segments, visited):
+    if part.partname in visited:
+        return 0
+    visited.add(part.partname)
+    
+    count = 0
+    for paragraph in part._element.iter(_DRAWING_PARAGRAPH):
+        # 译文按行内标记写回原有run，保留每个run的格式
+        segment = paragraph_segment(paragraph, DRAWING)
+        if segment:
+            segments.append(segment)
+            count += 1
+    return count
+
+# 收集部件引用的图表中的文本：按图形框中c:chart的r:id查找图表部件
+# 按rId查找和related_part在python-pptx 0.6和1.0中都可用，part.rels的遍历方式在两个版本间不同
+def _collect_pptx_charts(part, segments, visited):
+    count = 0
+    for chart in part._element.iter(_CHART_REFERENCE):
+        rel_id = chart.get(_RELATIONSHIP_ID)
+        if rel_id in part.rels:
+            count += _collect_pptx_part(part.related_part(rel_id), segments, visited)
+    return count
+
+# 解析PPTX文件：幻灯片、备注、图表以及母版和版式中的文本
+# 页脚、版式占位符等重复文本在run_segments中去重，每份演示文稿只翻译一次
+# stats为字典时写入每张幻灯片的片段数（slide_segments）和母版、版式的片段数（template_segments）
+def parse_pptx(file_path, stats=None):
     # 打开演示文稿
     prs = pptx.Presentation(file_path)
+    segments = []
+    visited = set()
+    
+    # 遍历所有幻灯片，备注和图表计入所在幻灯片
+    slide_segments = {}
+    for index, slide in enumerate(prs.slides, 1):
+        count = _collect_pptx_part(slide.part, segments, visited)
+        count += _collect_pptx_charts(slide.part, segments, visited)
+        if slide.has_notes_slide:
+            count += _collect_pptx_part(slide.notes_slide.part, segments, visited)
+        slide_segments[str(index)] = count
     
-    # 遍历所有幻灯片
-    for slide in prs.slides:
-        # 遍历所有形状
-        for shape in slide.shapes:
-            if hasattr(shape, 'text') and shape.text.strip():
-                # 保存原始字体属性
-                original_text_frame = shape.text_frame
-                original_font = None
-                original_size = None
-                original_color = None
-                
-                if original_text_frame and original_text_frame.paragraphs:
-                    for para in original_text_frame.paragraphs:
-                        if para.runs:
-                            original_font = para.runs[0].font.name
-                            original_size = para.runs[0].font.size
-                            original_color = para.runs[0].font.color.rgb if hasattr(para.runs[0].font.color, 'rgb') else None
-                            break
-                
-                # 翻译形状文本
-                translated_text = translate_func(shape.text, source_lang, target_lang, custom_prompt)
-                shape.text = translated_text
-                
-                # 恢复字体属性
-                if original_text_frame and original_text_frame.paragraphs and original_font:
-                    for para in original_text_frame.paragraphs:
-                        for run in para.runs:
-                            run.font.name = original_font
-                            if original_size:
-                                run.font.size = original_size
-                            if original_color:
-                                run.font.color.rgb = original_color
-            
-            # 处理表格
-            if shape.has_table:
-                table = shape.table
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            # 保存原始字体属性
-                            original_font = None
-                            original_size = None
-                            if cell.text_frame and cell.text_frame.paragraphs:
-                                for para in cell.text_frame.paragraphs:
-                                    if para.runs:
-                                        original_font = para.runs[0].font.name
-                                        original_size = para.runs[0].font.size
-                                        break
-                            
-                            translated_text = translate_func(cell.text, source_lang, target_lang, custom_prompt)
-                            cell.text = translated_text
-                            
-                            # 恢复字体属性
-                            if cell.text_frame and cell.text_frame.paragraphs and original_font:
-                                for para in cell.text_frame.paragraphs:
-                                    for run in para.runs:
-                                        run.font.name = original_font
-                                        if original_size:
-                                            run.font.size = original_size
-    
-    return prs, 'pptx'
+    # 遍历母版和版式
+    template_segments = 0
+    for master in prs.slide_masters:
+        template_segments += _collect_pptx_part(master.part, segments, visited)
+        for layout in master.slide_layouts:
+            template_segments += _collect_pptx_part(layout.part, segments, visited)
+            template_segments += _collect_pptx_charts(layout.part, segments, visited)
+    
+    if stats is not None:
+        stats['slide_segments'] = slide_segments
+        stats['template_segments'] = template_segments
+    
+    return ParsedDocument(prs, 'pptx', segments)
+
+# 处理PPTX文件
+def process_pptx(file_path, source_lang, target_lang, translate_func, custom_prompt=None, **options):
+    return translate_document(parse_pptx(file_path, options.get('stats')), source_lang, target_lang, translate_func, custom_prompt, **options)
 
 # 处理DOC文件（转换为DOCX后处理）
-def process_doc(file_path, source_lang, target_lang, translate_func, custom_prompt=None):
+def parse_doc(file_path):
     # 这里简化处理，实际上可能需要使用python-docx2txt或其他库
     # 或者提示用户将DOC文件转换为DOCX后再上传
     # 为了演示，我们创建一个新的DOCX文件
@@ -151,10 +503,10 @@ def process_doc(file_path, source_lang, target_lang, translate_func, custom_prom
     doc.add_heading('DOC文件翻译提示', 0)
     doc.add_paragraph('由于技术限制，.doc文件需要先转换为.docx格式后再进行翻译。')
     doc.add_paragraph('请使用Microsoft Word或其他工具将文件转换后重新上传。')
-    return doc, 'docx'
+    return ParsedDocument(doc, 'docx')
 
 # 处理XLS文件（转换为XLSX后处理）
-def process_xls(file_path, source_lang, target_lang, translate_func, custom_prompt=None):
+def parse_xls(file_path):
     # 类似DOC文件的处理方式
     wb = openpyxl.Workbook()
     ws = wb.active
@@ -162,22 +514,23 @@ def process_xls(file_path, source_lang, target_lang, translate_func, custom_prom
     ws['A1'] = 'XLS文件翻译提示'
     ws['A2'] = '由于技术限制，.xls文件需要先转换为.xlsx格式后再进行翻译。'
     ws['A3'] = '请使用Microsoft Excel或其他工具将文件转换后重新上传。'
-    return wb, 'xlsx'
+    return ParsedDocument(wb, 'xlsx')
 
-# 根据文件类型选择相应的处理函数
-def process_file(file_path, source_lang, target_lang, translate_func, custom_prompt=None):
+# 根据文件类型选择相应的解析函数
+# 流式阈值只对XLSX有效，stats只用于记录PPTX每张幻灯片的片段数
+def parse_document(file_path, xlsx_stream_threshold=DEFAULT_XLSX_STREAM_THRESHOLD, stats=None):
     file_ext = os.path.splitext(file_path)[1].lower()
     
     if file_ext == '.docx':
-        return process_docx(file_path, source_lang, target_lang, translate_func, custom_prompt)
+        return parse_docx(file_path)
     elif file_ext == '.doc':
-        return process_doc(file_path, source_lang, target_lang, translate_func, custom_prompt)
+        return parse_doc(file_path)
     elif file_ext == '.xlsx':
-        return process_xlsx(file_path, source_lang, target_lang, translate_func, custom_prompt)
+        return parse_xlsx(file_path, xlsx_stream_threshold)
     elif file_ext == '.xls':
-        return process_xls(file_path, source_lang, target_lang, translate_func, custom_prompt)
+        return parse_xls(file_path)
     elif file_ext == '.pptx':
-        return process_pptx(file_path, source_lang, target_lang, translate_func, custom_prompt)
+        return parse_pptx(file_path, stats)
     elif file_ext == '.ppt':
         # 对于PPT文件，创建一个新的PPTX文件作为提示
         prs = pptx.Presentation()
@@ -187,10 +540,46 @@ def process_file(file_path, source_lang, target_lang, translate_func, custom_pro
         subtitle = slide.placeholders[1]
         title.text = "PPT文件翻译提示"
         subtitle.text = "由于技术限制，.ppt文件需要先转换为.pptx格式后再进行翻译。\n请使用Microsoft PowerPoint或其他工具将文件转换后重新上传。"
-        return prs, 'pptx'
+        return ParsedDocument(prs, 'pptx')
     else:
         raise ValueError(f"不支持的文件格式: {file_ext}")
 
+# 翻译解析后的文档并写回译文，返回(文档对象, 文件类型)
+def translate_document(document, source_lang, target_lang, translate_func, custom_prompt=None, **options):
+    if document.segments:
+        run_segments(document.segments, source_lang, target_lang, translate_func, custom_prompt, ignore_errors=document.ignore_errors, **options)
+    if document.finalize:
+        document.finalize()
+    return document.content, document.file_type
+
+# 根据文件类型选择相应的处理函数
+def process_file(file_path, source_lang, target_lang, translate_func, custom_prompt=None, **options):
+    xlsx_stream_threshold = options.pop('xlsx_stream_threshold', DEFAULT_XLSX_STREAM_THRESHOLD)
+    document = parse_document(file_path, xlsx_stream_threshold, options.get('stats'))
+    return translate_document(document, source_lang, target_lang, translate_func, custom_prompt, **options)
+
+# 把一份文档翻译为多种目标语言：文档只解析一次，片段收集、去重和过滤结果各目标语言共享，翻译请求并发执行
+# 每种目标语言的译文写回后调用on_target(目标语言, 文档对象, 文件类型)，由调用方保存该语言的文件；返回文件类型
+def process_file_targets(file_path, source_lang, target_langs, translate_func, custom_prompt=None, on_target=None, **options):
+    xlsx_stream_threshold = options.pop('xlsx_stream_threshold', DEFAULT_XLSX_STREAM_THRESHOLD)
+    document = parse_document(file_path, xlsx_stream_threshold, options.get('stats'))
+    
+    def write_target(target_lang):
+        if document.finalize:
+            document.finalize()
+        if on_target:
+            on_target(target_lang, document.content, document.file_type)
+    
+    if document.segments:
+        run_segments_targets(
+            document.segments, source_lang, target_langs, translate_func, custom_prompt,
+            ignore_errors=document.ignore_errors, on_target=write_target, **options
+        )
+    else:
+        for target_lang in target_langs:
+            write_target(target_lang)
+    return document.file_type
+
 # 保存翻译后的文件
 def save_translated_file(content, file_type, output_path):
     if file_type == 'docx':
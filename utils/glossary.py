@@ -0,0 +1,81 @@
+import csv
+import io
+import os
+
+import openpyxl
+
+# 术语表：用户上传的CSV/TSV/TXT文本或XLSX工作簿
+# 没有表头时前两列为原文术语和译文术语，适用于所有目标语言；
+# 第一行全部为语言代码或名称（例如"en,zh,ja"）时作为表头：第一列为原文术语，其余各列为对应目标语言的译法
+
+# 读取术语表的所有行，返回[[单元格文本, ...]]
+def _read_rows(stream, filename):
+    if os.path.splitext(filename or '')[1].lower() == '.xlsx':
+        wb = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            return [
+                ['' if value is None else str(value) for value in row]
+                for row in wb.worksheets[0].iter_rows(values_only=True)
+            ]
+        finally:
+            wb.close()
+
+    data = stream.read()
+    for encoding in ('utf-8-sig', 'gb18030'):
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError('无法识别术语表的文本编码')
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=',\t;')
+    except csv.Error:
+        dialect = csv.excel_tab if '\t' in text else csv.excel
+    return list(csv.reader(io.StringIO(text), dialect))
+
+# 读取术语表，返回{目标语言名称: [[原文术语, 译文术语], ...]}，适用于所有目标语言的术语键为''
+# languages为{语言代码或名称: 语言名称}，用于识别表头；术语总数超过max_terms时抛出ValueError
+def load_glossary(stream, filename, languages, max_terms=None):
+    rows = [[cell.strip() for cell in row] for row in _read_rows(stream, filename)]
+    rows = [row for row in rows if len(row) >= 2 and row[0] and any(row[1:])]
+    if not rows:
+        return {}
+
+    header = rows[0]
+    if all(cell in languages for cell in header if cell):
+        columns = [(index, languages[cell]) for index, cell in enumerate(header) if index > 0 and cell]
+        rows = rows[1:]
+    else:
+        columns = [(1, '')]
+
+    glossary = {}
+    seen = set()
+    count = 0
+    for row in rows:
+        for index, target_lang in columns:
+            if index >= len(row) or not row[index] or (target_lang, row[0]) in seen:
+                continue
+            seen.add((target_lang, row[0]))
+            glossary.setdefault(target_lang, []).append([row[0], row[index]])
+            count += 1
+    if max_terms is not None and count > max_terms:
+        raise ValueError(f'术语表超过{max_terms}条的限制')
+    return glossary
+
+# 目标语言适用的术语：按语言区分的术语在前，通用术语在后，同一原文术语只保留一条
+def glossary_terms(glossary, target_lang):
+    if not glossary:
+        return []
+    terms = []
+    seen = set()
+    for source_term, target_term in (glossary.get(target_lang) or []) + (glossary.get('') or []):
+        if source_term not in seen:
+            seen.add(source_term)
+            terms.append((source_term, target_term))
+    return terms
+
+# 术语表的提示词文本，每行一条，顺序与上传的术语表一致
+def format_glossary(terms):
+    return '\n'.join(f'{source_term} => {target_term}' for source_term, target_term in terms)
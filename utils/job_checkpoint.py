@@ -0,0 +1,97 @@
+import json
+import os
+import sqlite3
+import threading
+
+# 任务检查点：每个任务一个SQLite文件，保存任务参数、片段清单和已完成的译文
+# 任务中断（进程崩溃、API故障）后可以从第一个未完成的片段继续翻译
+# 一个任务翻译为多种目标语言时，片段清单和译文按目标语言分别记录
+class JobCheckpoint:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "target TEXT NOT NULL, position INTEGER NOT NULL, text TEXT NOT NULL, translation TEXT, "
+            "PRIMARY KEY (target, text))"
+        )
+        self._conn.commit()
+
+    # 保存任务参数（值需可JSON序列化）
+    def save_metadata(self, metadata):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in metadata.items()]
+            )
+            self._conn.commit()
+
+    def load_metadata(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM metadata").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    # 记录目标语言的待翻译片段清单，已有的片段保持原有位置和译文
+    def set_manifest(self, texts, target=''):
+        with self._lock:
+            start = self._conn.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM segments WHERE target = ?", (target,)
+            ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO segments (target, position, text) VALUES (?, ?, ?)",
+                [(target, start + offset, text) for offset, text in enumerate(texts)]
+            )
+            self._conn.commit()
+
+    # 返回目标语言已完成的译文{原文: 译文}
+    def completed(self, target=''):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text, translation FROM segments WHERE target = ? AND translation IS NOT NULL ORDER BY position",
+                (target,)
+            ).fetchall()
+        return dict(rows)
+
+    # 记录片段译文，翻译失败（None）的片段不记录
+    def put_many(self, pairs, target=''):
+        pairs = [(translation, target, text) for text, translation in pairs if translation is not None]
+        if not pairs:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE segments SET translation = ? WHERE target = ? AND text = ?", pairs)
+            self._conn.commit()
+
+    def put(self, text, translation, target=''):
+        self.put_many([(text, translation)], target)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # 关闭并删除检查点文件
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+# 任务工作目录中的检查点文件路径
+def checkpoint_path(work_dir):
+    return os.path.join(work_dir, 'checkpoint.sqlite')
+
+# 读取检查点中的任务参数，检查点不存在时返回None
+def load_checkpoint_metadata(work_dir):
+    path = checkpoint_path(work_dir)
+    if not os.path.exists(path):
+        return None
+    checkpoint = JobCheckpoint(path)
+    try:
+        return checkpoint.load_metadata()
+    finally:
+        checkpoint.close()
@@ -0,0 +1,374 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.metrics import REGISTRY
+
+# 翻译任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+# 任务工作目录中的状态文件、取消标记文件和继续翻译标记文件
+JOB_STATE_FILE = 'job.json'
+JOB_CANCEL_FILE = 'cancel'
+JOB_RESUME_FILE = 'resume.lock'
+
+# 状态文件和取消标记的最短同步间隔（秒）
+_SYNC_INTERVAL = 1.0
+
+# 任务被用户取消时抛出
+class JobCancelled(Exception):
+    pass
+
+# 单个翻译任务，记录状态、进度和统计信息
+# 指定work_dir时任务状态会同步写入工作目录，供其他工作进程查询，并通过取消标记文件接收其他进程的取消请求
+class Job:
+    def __init__(self, owner=None, job_id=None, work_dir=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.owner = owner
+        self.work_dir = work_dir
+        self.status = JOB_QUEUED
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.result = None
+        self.stats = {}
+        self.timings = {}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._synced_at = 0.0
+
+    # 更新翻译进度（已完成片段数/总片段数）
+    def update_progress(self, done, total):
+        with self._lock:
+            self.done = done
+            self.total = total
+        self.sync()
+
+    # 累加任务计数器，同时计入全局指标
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+        REGISTRY.inc('translate_job_events_total', amount, event=name)
+
+    # 累加任务各阶段的耗时（秒）
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    # 请求取消任务，正在进行的流式请求会尽快中止
+    def cancel(self):
+        self.cancel_event.set()
+        if self.work_dir:
+            request_cancel(self.work_dir)
+
+    # 任务已被取消时抛出JobCancelled
+    def check_cancelled(self):
+        self.sync()
+        if self.cancel_event.is_set():
+            raise JobCancelled('任务已取消')
+
+    # 把任务状态写入工作目录并检查取消标记；force为False时按_SYNC_INTERVAL节流
+    def sync(self, force=False):
+        if not self.work_dir:
+            return
+        now = time.monotonic()
+        if not force and now - self._synced_at < _SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        if os.path.exists(os.path.join(self.work_dir, JOB_CANCEL_FILE)):
+            self.cancel_event.set()
+        save_job_state(self.work_dir, self.state())
+
+    # 根据已用时间估算剩余时间（秒）
+    def eta_seconds(self):
+        if self.status != JOB_RUNNING or not self.started_at or not self.done or not self.total:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / self.done * (self.total - self.done), 1)
+
+    def to_dict(self):
+        with self._lock:
+            data = {
+                'job_id': self.id,
+                'status': self.status,
+                'done': self.done,
+                'total': self.total,
+                'percent': round(self.done * 100 / self.total, 1) if self.total else 0.0,
+                'stats': dict(self.stats),
+                'timings': {name: round(seconds, 3) for name, seconds in self.timings.items()},
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at
+            }
+        data['eta_seconds'] = self.eta_seconds()
+        if self.result:
+            data.update(self.result)
+        return data
+
+    # 写入状态文件的内容：任务信息加上所属用户和执行进程
+    def state(self):
+        data = self.to_dict()
+        data['owner'] = self.owner
+        data['pid'] = os.getpid()
+        data['updated_at'] = time.time()
+        return data
+
+# 原子地写入任务状态文件
+def save_job_state(work_dir, state):
+    path = os.path.join(work_dir, JOB_STATE_FILE)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+    except OSError:
+        # 工作目录已被清理（例如译文已下载）时忽略
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+# 读取任务状态文件，不存在或无法解析时返回None
+def load_job_state(work_dir):
+    try:
+        with open(os.path.join(work_dir, JOB_STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# 在工作目录中写入取消标记，执行任务的进程会在下次同步时取消任务
+def request_cancel(work_dir):
+    try:
+        open(os.path.join(work_dir, JOB_CANCEL_FILE), 'w').close()
+    except OSError:
+        pass
+
+# 以O_EXCL创建继续翻译标记，内容为当前进程号；标记已存在时返回False，多个进程同时继续同一任务时只有一个成功
+# 标记记录的进程已经退出时视为残留标记，删除后重新创建
+def _claim_resume(work_dir):
+    path = os.path.join(work_dir, JOB_RESUME_FILE)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    content = f.read()
+            except OSError:
+                return False
+            # 内容为空时另一个进程刚创建标记、尚未写入进程号
+            if not content.isdigit() or process_alive(int(content)):
+                return False
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+# 删除继续翻译标记
+def _release_resume(work_dir):
+    try:
+        os.remove(os.path.join(work_dir, JOB_RESUME_FILE))
+    except OSError:
+        pass
+
+# 判断状态文件记录的执行进程是否仍在运行（只能判断本机进程）
+def process_alive(pid):
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # Windows下os.kill会结束进程，无法用来探测，按仍在运行处理
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# 后台任务管理器：用线程池执行任务，并按任务ID查询状态
+# 指定jobs_dir时每个任务使用独立的工作目录，状态写入目录中的状态文件，供其他工作进程查询
+class JobManager:
+    def __init__(self, max_workers=2, retention_seconds=24 * 3600, jobs_dir=None, output_retention_seconds=3600):
+        self.retention_seconds = retention_seconds
+        self.output_retention_seconds = output_retention_seconds
+        self.jobs_dir = jobs_dir
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='translate-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._resume_lock = threading.Lock()
+        if jobs_dir:
+            os.makedirs(jobs_dir, exist_ok=True)
+
+    # 任务的工作目录
+    def job_dir(self, job_id):
+        return os.path.join(self.jobs_dir, job_id) if self.jobs_dir else None
+
+    # 提交任务，func(job)的返回值作为任务结果；继续中断的任务时传入原任务ID
+    def submit(self, func, owner=None, job_id=None):
+        return self._submit(func, owner, job_id)
+
+    # resumed为True时任务由resume提交，结束时删除继续翻译标记
+    def _submit(self, func, owner, job_id, resumed=False):
+        job_id = job_id or uuid.uuid4().hex
+        work_dir = self.job_dir(job_id)
+        if work_dir:
+            os.makedirs(work_dir, exist_ok=True)
+            # 清除上一次执行留下的取消标记
+            cancel_path = os.path.join(work_dir, JOB_CANCEL_FILE)
+            if os.path.exists(cancel_path):
+                os.remove(cancel_path)
+        job = Job(owner, job_id, work_dir)
+        job.sync(force=True)
+        with self._lock:
+            self._purge_expired()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, func, resumed)
+        return job
+
+    # 继续中断的任务：任务不在排队或执行中时以原任务ID提交，返回Job；否则返回None
+    # 检查和提交在进程内加锁，并通过工作目录中的继续翻译标记与其他工作进程互斥，同时继续同一任务时只有一个成功；
+    # 标记在任务结束时删除
+    def resume(self, func, owner, job_id):
+        work_dir = self.job_dir(job_id)
+        with self._resume_lock:
+            if work_dir and not _claim_resume(work_dir):
+                return None
+            state = self.load_state(job_id)
+            if state and state['status'] in (JOB_QUEUED, JOB_RUNNING):
+                if work_dir:
+                    _release_resume(work_dir)
+                return None
+            return self._submit(func, owner, job_id, resumed=True)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    # 查询任务状态：优先使用本进程中的任务，其次读取工作目录中的状态文件
+    # 状态文件显示任务未结束、但执行进程已经退出时，任务按中断（interrupted=True）报告
+    def load_state(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            return job.state()
+        work_dir = self.job_dir(job_id)
+        state = load_job_state(work_dir) if work_dir else None
+        if state and state['status'] in (JOB_QUEUED, JOB_RUNNING) and not process_alive(state.get('pid')):
+            state['status'] = JOB_FAILED
+            state['error'] = '任务已中断'
+            state['interrupted'] = True
+        return state
+
+    # 各状态的任务数；指定jobs_dir时按工作目录中的状态文件统计，包含其他工作进程的任务
+    def count_by_status(self):
+        if self.jobs_dir:
+            try:
+                job_ids = [name for name in os.listdir(self.jobs_dir) if os.path.isdir(os.path.join(self.jobs_dir, name))]
+            except OSError:
+                job_ids = []
+            states = [self.load_state(job_id) for job_id in job_ids]
+            statuses = [state['status'] for state in states if state]
+        else:
+            with self._lock:
+                statuses = [job.status for job in self._jobs.values()]
+        counts = {}
+        for status in statuses:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    # 删除任务的工作目录
+    def remove_job_dir(self, job_id):
+        work_dir = self.job_dir(job_id)
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 启动后台清理线程，定期删除过期的工作目录
+    def start_sweeper(self, interval=300):
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"清理任务目录失败: {str(e)}")
+        thread = threading.Thread(target=loop, name='translate-job-sweeper', daemon=True)
+        thread.start()
+        return thread
+
+    # 删除过期的工作目录：已完成但没有被下载的译文保留output_retention_seconds，
+    # 失败、取消或中断的任务（可以继续翻译）保留retention_seconds
+    def sweep(self):
+        if not self.jobs_dir:
+            return
+        now = time.time()
+        for job_id in os.listdir(self.jobs_dir):
+            work_dir = os.path.join(self.jobs_dir, job_id)
+            if not os.path.isdir(work_dir):
+                continue
+            job = self.get(job_id)
+            if job is not None and job.status in (JOB_QUEUED, JOB_RUNNING):
+                continue
+            state = load_job_state(work_dir)
+            if state and state['status'] in (JOB_QUEUED, JOB_RUNNING) and process_alive(state.get('pid')):
+                continue
+            try:
+                modified = max(
+                    [os.path.getmtime(work_dir)] +
+                    [os.path.getmtime(os.path.join(work_dir, name)) for name in os.listdir(work_dir)]
+                )
+            except OSError:
+                continue
+            retention = self.output_retention_seconds if state and state['status'] == JOB_COMPLETED else self.retention_seconds
+            if now - modified > retention:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        with self._lock:
+            self._purge_expired()
+
+    def _run(self, job, func, resumed=False):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        job.sync(force=True)
+        try:
+            job.check_cancelled()
+            job.result = func(job)
+            job.status = JOB_COMPLETED
+        except JobCancelled as e:
+            job.error = str(e)
+            job.status = JOB_CANCELLED
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+        finally:
+            job.finished_at = time.time()
+            job.sync(force=True)
+            if resumed and job.work_dir:
+                _release_resume(job.work_dir)
+            REGISTRY.inc('translate_jobs_total', status=job.status)
+            REGISTRY.observe('translate_job_seconds', job.finished_at - job.started_at, status=job.status)
+
+    # 清理过期的已结束任务，避免任务表无限增长
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at and now - job.finished_at > self.retention_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# 进程内指标：计数器、仪表和直方图，按Prometheus文本格式输出
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+PHASE_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels, extra=None):
+    items = list(labels)
+    if extra:
+        items.append(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+# 指标注册表，指标按名称和标签区分
+class MetricsRegistry:
+    def __init__(self):
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    # 登记指标说明和直方图分桶（可选）
+    def describe(self, name, help_text, buckets=None):
+        with self._lock:
+            self._help[name] = help_text
+            if buckets:
+                self._buckets[name] = tuple(buckets)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = _Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    # 输出Prometheus文本格式
+    def render(self):
+        lines = []
+        with self._lock:
+            for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted({name for name, _ in metrics}):
+                    self._render_header(lines, name, kind)
+                    for (metric_name, labels), value in sorted(metrics.items()):
+                        if metric_name == name:
+                            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+            for name in sorted({name for name, _ in self._histograms}):
+                self._render_header(lines, name, 'histogram')
+                for (metric_name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric_name != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_format_labels(labels, ("le", bound))} {count}')
+                    lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {round(histogram.sum, 6)}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def _render_header(self, lines, name, kind):
+        if name in self._help:
+            lines.append(f'# HELP {name} {self._help[name]}')
+        lines.append(f'# TYPE {name} {kind}')
+
+# 全局指标注册表
+REGISTRY = MetricsRegistry()
+REGISTRY.describe('translate_job_events_total', '翻译任务计数器（API调用、重试、token用量、缓存命中等）')
+REGISTRY.describe('translate_jobs_total', '结束的翻译任务数')
+REGISTRY.describe('translate_jobs', '当前各状态的翻译任务数')
+REGISTRY.describe('translate_job_seconds', '翻译任务端到端耗时', PHASE_BUCKETS)
+REGISTRY.describe('translate_job_phase_seconds', '翻译任务各阶段耗时', PHASE_BUCKETS)
+REGISTRY.describe('translate_api_request_seconds', '模型API请求耗时')
+REGISTRY.describe('translate_segment_seconds', '单个片段两步翻译耗时')
+REGISTRY.describe('translate_auth_request_seconds', '账号验证请求耗时')
+REGISTRY.describe('translate_audit_queue', '等待发送的审计事件数')
+
+# 累加任务计数器；没有所属任务时只计入全局指标
+def record_event(job, name, amount=1):
+    if job is not None:
+        job.incr(name, amount)
+    else:
+        REGISTRY.inc('translate_job_events_total', amount, event=name)
+
+# 计时上下文：结束时写入直方图；传入job和timing时同时累加到任务的耗时统计
+@contextmanager
+def timed(metric, job=None, timing=None, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe(metric, elapsed, **labels)
+        if job is not None and timing:
+            job.add_time(timing, elapsed)
@@ -0,0 +1,202 @@
+import re
+
+from lxml import etree
+
+# 段落级行内标记：把格式不同的run分组，用<g1>…</g1>这样的标记包住各组文本发送给模型，
+# 再按模型回显的标记把译文写回原有run的文本节点，不重建段落，保留每个run的格式
+
+_GROUP_RE = re.compile(r'<g(\d+)>(.*?)</g\1>', re.S)
+_TAG_RE = re.compile(r'</?g\d+>')
+
+WORD_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+DRAWING_NS = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+
+# 文本是否包含行内标记
+def has_markup(text):
+    return bool(_TAG_RE.search(text))
+
+# 去除行内标记
+def strip_markup(text):
+    return _TAG_RE.sub('', text)
+
+# 不同文档格式的run结构描述
+class RunDialect:
+    def __init__(self, namespace, run_xpath, props_tag, text_tag, tab_tag=None, break_tags=(), multiline=True):
+        self.namespaces = {'x': namespace}
+        self.run_xpath = etree.XPath(run_xpath, namespaces=self.namespaces)
+        self.props_tag = f'{{{namespace}}}{props_tag}'
+        self.text_tag = f'{{{namespace}}}{text_tag}'
+        self.tab_tag = f'{{{namespace}}}{tab_tag}' if tab_tag else None
+        self.break_tags = {f'{{{namespace}}}{tag}' for tag in break_tags}
+        self.multiline = multiline
+
+    # run是否为普通文本run（而不是段落级的换行等分隔元素）
+    def is_run(self, element):
+        return element.tag == f'{{{self.namespaces["x"]}}}r' or element.tag == f'{{{self.namespaces["x"]}}}fld'
+
+    # run中属于文本的子节点：文本、制表符和普通换行（分页符等带类型的换行不算）
+    def text_children(self, run):
+        children = []
+        for child in run:
+            if child.tag == self.text_tag or child.tag == self.tab_tag:
+                children.append(child)
+            elif child.tag in self.break_tags and not child.get(f'{{{self.namespaces["x"]}}}type'):
+                children.append(child)
+        return children
+
+    def child_text(self, child):
+        if child.tag == self.text_tag:
+            return child.text or ''
+        if child.tag == self.tab_tag:
+            return '\t'
+        return '\n'
+
+    # 把文本转换为run的文本子节点
+    def make_text_children(self, text):
+        if not self.multiline:
+            text = text.replace('\n', ' ').replace('\v', ' ')
+            pieces = [text]
+        else:
+            pieces = re.split(r'(\t|\n)', text)
+
+        children = []
+        for piece in pieces:
+            if piece == '\t' and self.tab_tag:
+                children.append(etree.Element(self.tab_tag))
+            elif piece == '\n' and self.break_tags:
+                children.append(etree.Element(sorted(self.break_tags)[0]))
+            elif piece:
+                node = etree.Element(self.text_tag)
+                node.text = piece
+                if piece != piece.strip():
+                    node.set(XML_SPACE, 'preserve')
+                children.append(node)
+        return children
+
+WORD = RunDialect(
+    WORD_NS,
+    './x:r | ./x:hyperlink/x:r | ./x:ins/x:r | ./x:smartTag/x:r | ./x:fldSimple/x:r | ./x:sdt/x:sdtContent/x:r',
+    'rPr', 't', tab_tag='tab', break_tags=('br', 'cr')
+)
+
+DRAWING = RunDialect(
+    DRAWING_NS,
+    './x:r | ./x:fld | ./x:br',
+    'rPr', 't', multiline=False
+)
+
+# 同一格式、相邻的run组成的文本组
+class RunGroup:
+    def __init__(self, props_key):
+        self.props_key = props_key
+        self.runs = []
+
+    def text(self, dialect):
+        return ''.join(dialect.child_text(child) for run in self.runs for child in dialect.text_children(run))
+
+    # 把文本写入组内第一个run，清空其余run的文本节点
+    def set_text(self, dialect, text):
+        for index, run in enumerate(self.runs):
+            children = dialect.text_children(run)
+            position = run.index(children[0]) if children else len(run)
+            for child in children:
+                run.remove(child)
+            if index == 0:
+                for offset, child in enumerate(dialect.make_text_children(text)):
+                    run.insert(position + offset, child)
+
+# 把段落的run按格式分组；含图片、域代码等非文本内容的run及段落级换行会切断分组
+def group_runs(paragraph, dialect):
+    groups = []
+    current = None
+    for run in dialect.run_xpath(paragraph):
+        if not dialect.is_run(run):
+            current = None
+            continue
+
+        text_children = dialect.text_children(run)
+        other_children = [
+            child for child in run
+            if child.tag != dialect.props_tag and child not in text_children
+            and not (isinstance(child.tag, str) and child.tag.endswith('}lastRenderedPageBreak'))
+        ]
+        if not text_children:
+            if other_children:
+                current = None
+            continue
+        if other_children:
+            # 同时含文本和其他内容的run单独成组，保证其他内容的位置不变
+            group = RunGroup(None)
+            group.runs.append(run)
+            groups.append(group)
+            current = None
+            continue
+
+        props = run.find(dialect.props_tag)
+        props_key = etree.tostring(props) if props is not None else b''
+        if current is None or current.props_key != props_key:
+            current = RunGroup(props_key)
+            groups.append(current)
+        current.runs.append(run)
+    return groups
+
+# 解析模型返回的带标记译文，返回{组编号: 文本}；没有找到任何有效标记时返回None
+def parse_markup(translated_text, group_count):
+    result = {}
+    last_id = None
+    position = 0
+    for match in _GROUP_RE.finditer(translated_text):
+        group_id = int(match.group(1))
+        if group_id < 1 or group_id > group_count:
+            return None
+        outside = _TAG_RE.sub('', translated_text[position:match.start()])
+        if group_id == last_id:
+            # 分块翻译后拼接的译文中，同一标记组可能连续出现多次，合并为一组
+            result[group_id] += outside + _TAG_RE.sub('', match.group(2))
+            position = match.end()
+            continue
+        if group_id in result:
+            return None
+        # 标记之外的文本归入前一个标记组
+        if outside.strip() and last_id is not None:
+            result[last_id] += outside
+        elif outside.strip():
+            result[group_id] = outside
+        result[group_id] = result.get(group_id, '') + _TAG_RE.sub('', match.group(2))
+        last_id = group_id
+        position = match.end()
+
+    if last_id is None:
+        return None
+    trailing = _TAG_RE.sub('', translated_text[position:])
+    if trailing.strip():
+        result[last_id] += trailing
+    return result
+
+# 为段落生成翻译片段，返回(原文, 写回函数)；段落没有可翻译文本时返回None
+def paragraph_segment(paragraph, dialect):
+    groups = [group for group in group_runs(paragraph, dialect) if group.text(dialect).strip()]
+    if not groups:
+        return None
+
+    # 只有一组时直接发送纯文本
+    if len(groups) == 1:
+        group = groups[0]
+
+        def write_single(translated_text):
+            group.set_text(dialect, strip_markup(translated_text))
+
+        return group.text(dialect), write_single
+
+    text = ''.join(f'<g{index}>{group.text(dialect)}</g{index}>' for index, group in enumerate(groups, 1))
+
+    def write_groups(translated_text):
+        parsed = parse_markup(translated_text, len(groups))
+        if parsed is None:
+            # 模型没有保留标记时，整段译文写入第一组并清空其余组
+            parsed = {1: strip_markup(translated_text)}
+        for index, group in enumerate(groups, 1):
+            group.set_text(dialect, parsed.get(index, ''))
+
+    return text, write_groups
@@ -0,0 +1,132 @@
+import re
+import unicodedata
+
+from utils.run_markup import strip_markup
+from utils.tokens import estimate_tokens
+
+# 本地预过滤：识别无需翻译的片段（数字、日期、编号、邮箱、网址、公式、已是目标语言的文本），
+# 这些片段原样保留，不发送给模型
+
+# 语言名称到语言代码的映射（与app.py中的SUPPORTED_LANGUAGES保持一致）
+LANGUAGE_CODES = {
+    '中文': 'zh',
+    '英文': 'en',
+    '日文': 'ja',
+    '泰文': 'th'
+}
+
+_PASSTHROUGH_PATTERNS = [
+    ('url', re.compile(r'^(?:https?://|ftp://|www\.)\S+$', re.I)),
+    ('email', re.compile(r'^[\w.+-]+@[\w-]+(?:\.[\w-]+)+$')),
+    ('formula', re.compile(r'^=\S')),
+    ('number', re.compile(r'^[+\-±(]?[$€¥£￥₩฿]?\s*\d[\d,.\s\']*(?:%|‰)?\)?$')),
+    ('date', re.compile(r'^\d{1,4}[-/.年]\d{1,2}[-/.月]\d{1,4}日?(?:[T\s]+\d{1,2}:\d{2}(?::\d{2})?)?$')),
+    ('time', re.compile(r'^\d{1,2}:\d{2}(?::\d{2})?(?:\s*[AaPp][Mm])?$')),
+    ('code', re.compile(r'^(?=[^\s]*\d)[A-Za-z0-9]+(?:[-_./#:][A-Za-z0-9]+)+$')),
+    ('code', re.compile(r'^[A-Z]{1,5}\d{2,}[A-Z0-9]*$')),
+]
+
+# 统计文本中各文字体系的字符数
+def script_counts(text):
+    counts = {'han': 0, 'kana': 0, 'thai': 0, 'latin': 0, 'hangul': 0, 'other': 0}
+    for char in text:
+        code = ord(char)
+        if 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF or 0xF900 <= code <= 0xFAFF:
+            counts['han'] += 1
+        elif 0x3040 <= code <= 0x30FF or 0x31F0 <= code <= 0x31FF or 0xFF66 <= code <= 0xFF9F:
+            counts['kana'] += 1
+        elif 0x0E00 <= code <= 0x0E7F:
+            counts['thai'] += 1
+        elif 0xAC00 <= code <= 0xD7AF:
+            counts['hangul'] += 1
+        elif char.isalpha():
+            if code < 0x0250 or 0xFF21 <= code <= 0xFF5A:
+                counts['latin'] += 1
+            else:
+                counts['other'] += 1
+    return counts
+
+# 根据文字体系粗略判断文本语言，无法判断或混合文字时返回None
+def detect_language(text):
+    counts = script_counts(text)
+    letters = sum(counts.values())
+    if not letters:
+        return None
+    if counts['thai'] == letters:
+        return 'th'
+    if counts['kana'] and counts['kana'] + counts['han'] == letters:
+        return 'ja'
+    if counts['han'] == letters:
+        return 'zh'
+    if counts['latin'] == letters:
+        return 'en'
+    return None
+
+# 把语言名称或代码统一为语言代码
+def resolve_language(lang):
+    return LANGUAGE_CODES.get(lang, lang)
+
+# 判断片段是否需要翻译，返回(是否翻译, 跳过原因)
+def classify_segment(text, source_lang, target_lang):
+    stripped = strip_markup(text).strip()
+    if not stripped:
+        return False, 'empty'
+
+    # 没有任何文字字符（纯数字、标点、符号）
+    if not any(unicodedata.category(char).startswith('L') for char in stripped):
+        return False, 'symbol'
+
+    for reason, pattern in _PASSTHROUGH_PATTERNS:
+        if pattern.match(stripped):
+            return False, reason
+
+    source_code = resolve_language(source_lang)
+    target_code = resolve_language(target_lang)
+    detected = detect_language(stripped)
+    if detected and detected == target_code and detected != source_code:
+        # 纯汉字文本在日译中时无法区分中日文，仍然交给模型翻译
+        if not (detected == 'zh' and source_code == 'ja'):
+            return False, 'target_language'
+
+    return True, None
+
+# 各语言的特征文字体系
+LANGUAGE_SCRIPTS = {
+    'zh': 'han',
+    'ja': 'kana',
+    'th': 'thai',
+    'en': 'latin'
+}
+
+# 模型把提示词或第二步输入格式回显到译文中的特征
+_ECHO_MARKERS = ('原文:', '初步翻译:', '{{source_lang}}', '{{target_lang}}', '专业的语言学家')
+
+# 对第一步译文做本地检查，返回发现的问题列表（为空表示没有发现问题）
+def check_translation(source_text, translated_text, source_lang, target_lang):
+    source = strip_markup(source_text).strip()
+    translated = strip_markup(translated_text).strip()
+    if not translated:
+        return ['empty']
+
+    issues = []
+    # 长度比例异常（过短的片段不做比例检查）
+    source_tokens = estimate_tokens(source)
+    if source_tokens >= 5:
+        ratio = estimate_tokens(translated) / source_tokens
+        if ratio < 0.3 or ratio > 3:
+            issues.append('length_ratio')
+
+    # 译文中残留大量源语言文字
+    source_script = LANGUAGE_SCRIPTS.get(resolve_language(source_lang))
+    target_script = LANGUAGE_SCRIPTS.get(resolve_language(target_lang))
+    if source_script and source_script != target_script and not (source_script == 'han' and target_script == 'kana'):
+        counts = script_counts(translated)
+        letters = sum(counts.values())
+        if letters and counts[source_script] / letters > 0.3:
+            issues.append('untranslated')
+
+    # 回显了提示词
+    if any(marker in translated for marker in _ECHO_MARKERS):
+        issues.append('echo')
+
+    return issues
@@ -0,0 +1,15 @@
+import re
+
+# 本地token估算：不依赖分词器，按字符类别粗略估算
+# 中日文每个字符约1个token，泰文约每2个字符1个token，其他文字约每4个字符1个token
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿豈-﫿＀-￯]')
+_THAI_RE = re.compile(r'[฀-๿]')
+
+# 估算文本的token数量
+def estimate_tokens(text):
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    thai = len(_THAI_RE.findall(text))
+    other = len(text) - cjk - thai
+    return cjk + (thai + 1) // 2 + (other + 3) // 4
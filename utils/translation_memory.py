@@ -0,0 +1,153 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# SQLite数据库被其他进程锁定时的最长等待时间（秒）
+BUSY_TIMEOUT = 5
+
+# 翻译记忆：进程内LRU缓存 + SQLite磁盘存储
+# 键为（规范化原文、语言对、两步提示词、模型名）的哈希值
+# 数据库文件可以由多个工作进程和批量任务共享（WAL模式）；磁盘读写出错时按未命中处理，不影响翻译
+class TranslationMemory:
+    def __init__(self, db_path=None, max_memory_entries=10000, max_disk_entries=200000):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._puts_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_errors = 0
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=BUSY_TIMEOUT)
+            # WAL模式下读取不阻塞写入，多个进程写入时按busy timeout等待而不是立即失败
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translation_memory ("
+                "key TEXT PRIMARY KEY, translation TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_translation_memory_last_used "
+                "ON translation_memory (last_used)"
+            )
+            self._conn.commit()
+
+    # 规范化原文：统一Unicode形式并去除首尾空白
+    @staticmethod
+    def normalize(text):
+        return unicodedata.normalize('NFC', text).strip()
+
+    # 生成缓存键，variant用于区分会影响译文的其他设置
+    @classmethod
+    def make_key(cls, text, source_lang, target_lang, prompt_step1, prompt_step2, model, variant=''):
+        parts = [cls.normalize(text), source_lang, target_lang, prompt_step1 or '', prompt_step2 or '', model or '']
+        if variant:
+            parts.append(variant)
+        return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+    # 查询译文，未命中时返回None
+    def get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+
+            translation = None
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT translation FROM translation_memory WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    self._disk_error(e)
+                    row = None
+                if row:
+                    translation = row[0]
+                    self._remember(key, translation)
+                    try:
+                        self._conn.execute(
+                            "UPDATE translation_memory SET last_used = ? WHERE key = ?", (time.time(), key)
+                        )
+                        self._conn.commit()
+                    except sqlite3.Error as e:
+                        self._disk_error(e)
+
+            if translation is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return translation
+
+    # 写入译文
+    def put(self, key, translation):
+        with self._lock:
+            self._remember(key, translation)
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO translation_memory (key, translation, last_used) VALUES (?, ?, ?)",
+                        (key, translation, time.time())
+                    )
+                    self._conn.commit()
+                    self._puts_since_evict += 1
+                    # 每写入一定数量后检查一次磁盘容量，避免每次写入都统计行数
+                    if self._puts_since_evict >= 100:
+                        self._puts_since_evict = 0
+                        self._evict_disk()
+                except sqlite3.Error as e:
+                    self._disk_error(e)
+
+    # 返回命中统计
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'memory_entries': len(self._cache),
+                'disk_errors': self.disk_errors
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # 磁盘读写出错（例如数据库被其他进程长时间锁定）：回滚未完成的事务并计数
+    def _disk_error(self, error):
+        self.disk_errors += 1
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            pass
+        print(f"翻译记忆磁盘读写失败: {str(error)}")
+
+    # 写入内存LRU并按条目数淘汰最久未使用的记录
+    def _remember(self, key, translation):
+        self._cache[key] = translation
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_memory_entries:
+            self._cache.popitem(last=False)
+
+    # 磁盘超出容量时删除最久未使用的记录
+    def _evict_disk(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM translation_memory").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM translation_memory WHERE key IN ("
+                "SELECT key FROM translation_memory ORDER BY last_used ASC LIMIT ?)",
+                (overflow,)
+            )
+            self._conn.commit()
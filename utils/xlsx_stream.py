@@ -0,0 +1,218 @@
+import codecs
+import html
+import re
+import shutil
+import zipfile
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+# 大型工作簿流式处理：只改写共享字符串表和工作表中的内联字符串，
+# 其余部件（样式、公式、图表等）按原内容逐块复制，内存占用与文件大小无关
+
+SPREADSHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+CHUNK_SIZE = 1 << 20
+
+_SI_TAG = f'{{{SPREADSHEET_NS}}}si'
+_T_TAG = f'{{{SPREADSHEET_NS}}}t'
+_R_TAG = f'{{{SPREADSHEET_NS}}}r'
+_RPR_TAG = f'{{{SPREADSHEET_NS}}}rPr'
+_RPH_TAG = f'{{{SPREADSHEET_NS}}}rPh'
+_PHONETIC_TAG = f'{{{SPREADSHEET_NS}}}phoneticPr'
+
+_INLINE_OPEN_RE = re.compile(r'<((?:\w+:)?)is>')
+_INLINE_RE = re.compile(r'<((?:\w+:)?)is>(.*?)</\1is>', re.S)
+_INLINE_T_RE = re.compile(r'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', re.S)
+_INLINE_RPH_RE = re.compile(r'<((?:\w+:)?)rPh\b.*?</\1rPh>', re.S)
+
+# 共享字符串项的文本（忽略注音rPh）
+def _shared_string_text(si):
+    parts = []
+    for node in si.iter(_T_TAG):
+        parent = node.getparent()
+        if parent is not None and parent.tag == _RPH_TAG:
+            continue
+        parts.append(node.text or '')
+    return ''.join(parts)
+
+# 内联字符串<is>内部XML的文本
+def _inline_string_text(inner_xml):
+    inner_xml = _INLINE_RPH_RE.sub('', inner_xml)
+    return html.unescape(''.join(_INLINE_T_RE.findall(inner_xml)))
+
+# 逐块读取XML文本并替换其中完整的<is>元素，replace返回None时保留原文
+def _stream_inline_strings(src, dst, replace):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+        if chunk:
+            # 在最后一个未闭合的<is>或最后一个'<'处切分，保证标签不被截断；
+            # 最后一个'<'落在完整的<is>元素内部时切分在该元素的结束标签之后，保证元素不被拆开
+            cut = buffer.rfind('<')
+            last_open = None
+            for last_open in _INLINE_OPEN_RE.finditer(buffer):
+                pass
+            if last_open:
+                close_tag = f'</{last_open.group(1)}is>'
+                close = buffer.find(close_tag, last_open.end())
+                if close == -1:
+                    cut = last_open.start()
+                else:
+                    cut = max(cut, close + len(close_tag))
+            if cut <= 0:
+                continue
+        else:
+            cut = len(buffer)
+
+        head, buffer = buffer[:cut], buffer[cut:]
+        output = _INLINE_RE.sub(lambda match: replace(match) or match.group(0), head)
+        if dst is not None:
+            dst.write(output.encode('utf-8'))
+        if not chunk:
+            break
+
+# 流式处理的工作簿：保存时按译文改写共享字符串和内联字符串
+class StreamedWorkbook:
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.shared_strings_name = None
+        self.shared_translations = {}
+        self.inline_sheets = set()
+        self.inline_translations = {}
+
+    # 收集需要翻译的文本，返回(原文, 写回函数)列表
+    def collect_segments(self):
+        segments = []
+        with zipfile.ZipFile(self.source_path) as archive:
+            for name in archive.namelist():
+                if name.startswith('xl/') and name.endswith('sharedStrings.xml'):
+                    self.shared_strings_name = name
+                    segments.extend(self._collect_shared_strings(archive, name))
+                elif name.startswith('xl/worksheets/') and name.endswith('.xml'):
+                    segments.extend(self._collect_inline_strings(archive, name))
+        return segments
+
+    def _collect_shared_strings(self, archive, name):
+        segments = []
+        with archive.open(name) as src:
+            index = 0
+            for _, si in etree.iterparse(src, events=('end',), tag=_SI_TAG):
+                text = _shared_string_text(si)
+                if text.strip():
+                    segments.append((text, self._shared_writer(index, text)))
+                index += 1
+                # 释放已处理的节点，保持内存平稳
+                si.clear()
+                while si.getprevious() is not None:
+                    del si.getparent()[0]
+        return segments
+
+    def _collect_inline_strings(self, archive, name):
+        texts = []
+
+        def collect(match):
+            text = _inline_string_text(match.group(2))
+            if text.strip():
+                texts.append(text)
+            return None
+
+        with archive.open(name) as src:
+            _stream_inline_strings(src, None, collect)
+        if texts:
+            self.inline_sheets.add(name)
+        return [(text, self._inline_writer(text)) for text in texts]
+
+    # 写回原文时撤销该项的改写，保留原有的富文本格式（同一工作簿依次写入多种目标语言时使用）
+    def _shared_writer(self, index, text):
+        def write_back(translated_text):
+            if translated_text == text:
+                self.shared_translations.pop(index, None)
+            else:
+                self.shared_translations[index] = translated_text
+        return write_back
+
+    def _inline_writer(self, text):
+        def write_back(translated_text):
+            if translated_text == text:
+                self.inline_translations.pop(text, None)
+            else:
+                self.inline_translations[text] = translated_text
+        return write_back
+
+    # 写出翻译后的工作簿，未改动的部件逐块复制
+    def save(self, output_path):
+        with zipfile.ZipFile(self.source_path) as archive, \
+                zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as output:
+            for info in archive.infolist():
+                with archive.open(info) as src, output.open(info, 'w', force_zip64=info.file_size > 0x7fffffff) as dst:
+                    if info.filename == self.shared_strings_name and self.shared_translations:
+                        self._write_shared_strings(src, dst)
+                    elif info.filename in self.inline_sheets and self.inline_translations:
+                        self._write_inline_strings(src, dst)
+                    else:
+                        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+    def _write_shared_strings(self, src, dst):
+        with etree.xmlfile(dst, encoding='UTF-8') as xf:
+            xf.write_declaration(standalone=True)
+            root = None
+            depth = 0
+            index = 0
+            context = None
+            for event, element in etree.iterparse(src, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = element
+                        context = xf.element(root.tag, dict(root.attrib), nsmap=root.nsmap)
+                        context.__enter__()
+                    depth += 1
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+                output = element
+                if element.tag == _SI_TAG:
+                    if index in self.shared_translations:
+                        output = self._translated_si(element, self.shared_translations[index])
+                    index += 1
+                xf.write(output)
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+            if context is not None:
+                context.__exit__(None, None, None)
+
+    # 构造译文的共享字符串项：富文本保留第一个run的格式
+    @staticmethod
+    def _translated_si(si, translated_text):
+        new_si = etree.Element(_SI_TAG, nsmap=si.nsmap)
+        first_run = si.find(_R_TAG)
+        if first_run is not None:
+            run = etree.SubElement(new_si, _R_TAG)
+            rpr = first_run.find(_RPR_TAG)
+            if rpr is not None:
+                run.append(rpr)
+            text_parent = run
+        else:
+            text_parent = new_si
+        text = etree.SubElement(text_parent, _T_TAG)
+        text.text = translated_text
+        text.set(XML_SPACE, 'preserve')
+        phonetic = si.find(_PHONETIC_TAG)
+        if phonetic is not None:
+            new_si.append(phonetic)
+        return new_si
+
+    def _write_inline_strings(self, src, dst):
+        def replace(match):
+            translated_text = self.inline_translations.get(_inline_string_text(match.group(2)))
+            if translated_text is None:
+                return None
+            prefix = match.group(1)
+            return f'<{prefix}is><{prefix}t xml:space="preserve">{escape(translated_text)}</{prefix}t></{prefix}is>'
+
+        _stream_inline_strings(src, dst, replace)
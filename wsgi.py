@@ -0,0 +1,5 @@
+# 生产环境入口：gunicorn -c gunicorn.conf.py wsgi:app
+from app import app
+
+if __name__ == '__main__':
+    app.run()